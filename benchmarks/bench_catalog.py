@@ -0,0 +1,51 @@
+"""Benchmark catalog.search against a synthetic catalog the size of the /animes page.
+
+Usage: python benchmarks/bench_catalog.py [entries]
+"""
+import os
+import random
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(BENCH_DIR), 'scripts'))
+
+import catalog
+
+WORDS = [
+    'shingeki', 'no', 'kyojin', 'death', 'note', 'one', 'piece', 'naruto', 'shippuden', 'boku',
+    'hero', 'academia', 'kimetsu', 'yaiba', 'jujutsu', 'kaisen', 'tokyo', 'ghoul', 'sword', 'art',
+    'online', 'fullmetal', 'alchemist', 'brotherhood', 'hunter', 'x', 'steins', 'gate', 'code', 'geass',
+    'mob', 'psycho', '100', 'spy', 'family', 'chainsaw', 'man', 'bleach', 'dragon', 'ball', 'super',
+    'kaguya', 'sama', 'love', 'is', 'war', 'mushoku', 'tensei', 'rezero', 'kara', 'hajimeru', 'isekai',
+]
+
+QUERIES = ['death note', 'Shingeki no Kyoujin', 'narutp', 'one pi', 'jujutsu kaisne', 'ote', 'Pokémon', 'x']
+
+def synthetic_entries(count):
+    rng = random.Random(42)
+    entries = [{'name': 'Death Note', 'genre': 'Thriller', 'url': '/anime/stream/death-note'}]
+    for number in range(count - 1):
+        name = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 5))).title()
+        entries.append({'name': f"{name} {number}", 'genre': 'Action', 'url': f"/anime/stream/{number}"})
+    return entries
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    entries = synthetic_entries(count)
+
+    start = time.perf_counter()
+    index = catalog.CatalogIndex(entries)
+    print(f"{count} entries, index built in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    for query in QUERIES:
+        rounds = 200
+        start = time.perf_counter()
+        for _ in range(rounds):
+            results = index.search(query, limit=10)
+        elapsed = (time.perf_counter() - start) / rounds
+        top = results[0]['name'] if results else '-'
+        print(f"{query!r:24} {elapsed * 1000:7.3f} ms  top: {top}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Benchmark episode page fetching in extractor.extract_content_links against a local server.
+
+Usage: python benchmarks/bench_extractor.py [episodes] [latency_ms] [workers ...]
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(BENCH_DIR), 'scripts'))
+os.environ['ANI_TOOL_HTTP_CACHE'] = '0'  # Measure the network path, not the response cache
+
+import extractor
+import request_policy
+from fixture_pages import episode_page
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """Serves /staffel-S/episode-E pages after a fixed delay."""
+    latency = 0.05
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        parts = self.path.strip('/').split('/')
+        season = int(parts[-2].split('-')[1]) if len(parts) >= 2 else 1
+        episode = int(parts[-1].split('-')[1]) if parts and parts[-1].startswith('episode-') else 1
+        body = episode_page(season, episode).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def synthetic_anime_data(base_url, episodes):
+    """Anime data dict with one season of the given number of episodes."""
+    return {
+        'anime_name': 'Benchmark',
+        'movies': {'total_movies': 0, 'movie_list': []},
+        'seasons': {
+            'Season 1': {
+                'total_episodes': episodes,
+                'episodes': {
+                    f"E{number}": {
+                        'episode_title': f"Episode {number}",
+                        'episode_url': f"{base_url}/staffel-1/episode-{number}",
+                    }
+                    for number in range(1, episodes + 1)
+                },
+            }
+        },
+    }
+
+def main():
+    episodes = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    FixtureHandler.latency = (int(sys.argv[2]) if len(sys.argv) > 2 else 50) / 1000
+    worker_counts = [int(arg) for arg in sys.argv[3:]] or [1, 4, 8, 16]
+
+    extractor.logger.setLevel(logging.WARNING)
+    # Measure the workers, not the per-host rate ceiling (the fixture serves everything from one host)
+    request_policy.RATE_PER_HOST = 1000.0
+    request_policy.BURST_PER_HOST = 1000
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FixtureHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    anime_data = synthetic_anime_data(base_url, episodes)
+
+    print(f"{episodes} episodes, {FixtureHandler.latency * 1000:.0f} ms latency per page")
+    for workers in worker_counts:
+        start = time.perf_counter()
+        result = extractor.extract_content_links(anime_data, max_workers=workers, max_per_host=workers)
+        elapsed = time.perf_counter() - start
+        in_order = list(result) == [f"S1E{number} - Episode {number}" for number in range(1, episodes + 1)]
+        print(f"workers={workers:>3}  {elapsed:7.2f}s  {episodes / elapsed:8.1f} episodes/s  ordered={in_order}")
+
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
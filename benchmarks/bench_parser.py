@@ -0,0 +1,68 @@
+"""Benchmark per-page parse time of each HTML parser backend on fixture pages.
+
+Every backend must return exactly what the original full 'html.parser' parse returns.
+
+Usage: python benchmarks/bench_parser.py [rounds]
+"""
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(BENCH_DIR), 'scripts'))
+os.environ['ANI_TOOL_HTTP_CACHE'] = '0'
+
+import catalog
+import extractor
+import html_parser
+import info_getter
+from fixture_pages import catalog_page, episode_page, season_page
+
+SERIES_PATH = 'https://aniworld.to/anime/stream/benchmark'
+
+def backends():
+    """(name, parser, strained) combinations to compare; the first one is the reference."""
+    combos = [('html.parser full', 'html.parser', False), ('html.parser strained', 'html.parser', True)]
+    if html_parser.LXML_AVAILABLE:
+        combos += [('lxml full', 'lxml', False), ('lxml strained', 'lxml', True)]
+    return combos
+
+def page_cases():
+    """(page name, html, parse function(html, parser, strained))."""
+    names = [f"Series {number}" for number in range(2500)]
+    return [
+        ('episode page', episode_page(1, 1, padding=200),
+         lambda html, parser, strained: extractor.parse_stream_links(
+             html, parser=parser, parse_only=html_parser.EPISODE_PAGE if strained else None)),
+        ('season page (100 eps)', season_page(SERIES_PATH, 1, 100, padding=200),
+         lambda html, parser, strained: parse_season(html, parser, strained)),
+        ('catalog page (2500)', catalog_page(names, padding=200),
+         lambda html, parser, strained: catalog.parse_catalog(
+             html, parser=parser, parse_only=html_parser.CATALOG_PAGE if strained else None)),
+    ]
+
+def parse_season(html, parser, strained):
+    original_parser, original_season_table = html_parser.PARSER, html_parser.season_table
+    html_parser.PARSER = parser
+    if not strained:
+        html_parser.season_table = lambda season_number: None
+    try:
+        return info_getter.parse_season_page(html, SERIES_PATH, 1)
+    finally:
+        html_parser.PARSER, html_parser.season_table = original_parser, original_season_table
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    for page_name, html, parse in page_cases():
+        print(f"{page_name} ({len(html) / 1024:.0f} KiB)")
+        reference = None
+        for backend_name, parser, strained in backends():
+            start = time.perf_counter()
+            for _ in range(rounds):
+                result = parse(html, parser, strained)
+            elapsed = (time.perf_counter() - start) / rounds
+            reference = result if reference is None else reference
+            print(f"  {backend_name:22} {elapsed * 1000:8.2f} ms/page  identical={result == reference}")
+
+if __name__ == "__main__":
+    main()
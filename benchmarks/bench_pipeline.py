@@ -0,0 +1,146 @@
+"""Benchmark every pipeline stage and the streaming end-to-end run against the local fixture server.
+
+Usage: python benchmarks/bench_pipeline.py [episodes ...] [--latency MS] [--error-rate R] [--segments N]
+
+Defaults to synthetic series of 10, 100 and 1000 episodes (split into seasons of up to 100).
+Downloads, the URL and redirect caches and the manifest go to a temporary folder. Without
+ffmpeg the final remux step is skipped, so the download numbers then cover the segment
+transfer only.
+"""
+import argparse
+import contextlib
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(BENCH_DIR)
+sys.path.append(os.path.join(BASE_DIR, 'scripts'))
+sys.path.append(os.path.join(BASE_DIR, 'services', 'voe_dl'))
+
+from fixture_server import FixtureConfig, start_server
+
+# Must be set before the scrapers import config / http_cache
+os.environ['ANI_TOOL_HTTP_CACHE'] = '0'  # Measure the network path, not the response cache
+os.environ['ANI_TOOL_DOWNLOAD_ENGINE'] = 'native'
+server, BASE_URL = start_server(FixtureConfig())
+os.environ['ANI_TOOL_BASE_URL'] = BASE_URL
+
+import catalog
+import extractor
+import hls
+import pipeline
+import redirects
+import request_policy
+import url_cache
+import voe_download
+
+SERIES_PATH = '/anime/stream/benchmark-series'
+MAX_EPISODES_PER_SEASON = 100
+
+def shape(episodes):
+    """(seasons, episodes per season) for a synthetic series of about this many episodes."""
+    seasons = max(1, -(-episodes // MAX_EPISODES_PER_SEASON))
+    return seasons, -(-episodes // seasons)
+
+def use_scratch_dirs(scratch_dir):
+    """Keep downloads, the m3u8 URL cache and the redirect targets of the benchmark out of the real folders."""
+    voe_download.DOWNLOADS_DIR = os.path.join(scratch_dir, 'downloads')
+    url_cache.CACHE_DIR = os.path.join(scratch_dir, 'url_cache')
+    url_cache.CACHE_PATH = os.path.join(url_cache.CACHE_DIR, 'm3u8_urls.json')
+    url_cache._entries = None
+    redirects.CACHE_DIR = os.path.join(scratch_dir, 'redirects')
+    redirects.CACHE_PATH = os.path.join(redirects.CACHE_DIR, 'redirect_targets.json')
+    redirects._entries = None
+    if shutil.which('ffmpeg') is None:
+        hls.remux_to_mp4 = lambda input_file, output_file, adts_audio=True: os.replace(input_file, output_file)
+        return False
+    return True
+
+def timed(function, *args, **kwargs):
+    """Run a stage with its per-episode progress output silenced; returns (result, seconds)."""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        return result, time.perf_counter() - start
+
+def report(stage, items, unit, elapsed):
+    print(f"  {stage:<12} {items:>6} {unit:<9} {elapsed:8.2f}s  {items / elapsed if elapsed else 0:9.1f} {unit}/s")
+
+def bench_series(episodes):
+    seasons, per_season = shape(episodes)
+    config = server.RequestHandlerClass.config
+    config.seasons, config.episodes = seasons, per_season
+    total = seasons * per_season
+    print(f"\n{total} episodes ({seasons} seasons x {per_season}), "
+          f"{config.latency * 1000:.0f} ms latency, {config.error_rate:.0%} errors")
+
+    entries, elapsed = timed(catalog.scrape_catalog)
+    report('catalog', len(entries), 'series', elapsed)
+
+    anime_data, elapsed = timed(pipeline.gather_anime_info, BASE_URL + SERIES_PATH)
+    if anime_data is None:
+        print("  info stage failed, skipping this size")
+        return
+    report('info', anime_data['total_episodes'], 'episodes', elapsed)
+
+    content_links, elapsed = timed(pipeline.extract_anime_links, anime_data)
+    report('extract', len(content_links), 'episodes', elapsed)
+
+    m3u8_data, elapsed = timed(pipeline.gather_m3u8_urls, content_links)
+    streams = sum(len(languages) for languages in m3u8_data.values())
+    report('resolve', streams, 'streams', elapsed)
+
+    shutil.rmtree(voe_download.DOWNLOADS_DIR, ignore_errors=True)
+    failed, elapsed = timed(pipeline.download_anime_streams, m3u8_data, anime_data)
+    report('download', streams - len(failed), 'streams', elapsed)
+    megabytes = streams * config.segments * config.segment_bytes / 1e6
+    print(f"  {'':<12} {megabytes:>6.1f} MB        {megabytes / elapsed if elapsed else 0:18.1f} MB/s")
+
+    # Same work without stage barriers, starting from an empty downloads folder
+    shutil.rmtree(voe_download.DOWNLOADS_DIR, ignore_errors=True)
+    def end_to_end():
+        return pipeline.stream_anime_data(pipeline.gather_anime_info(BASE_URL + SERIES_PATH))
+    result, elapsed = timed(end_to_end)
+    print(f"  {'end-to-end':<12} {total:>6} {'episodes':<9} {elapsed:8.2f}s  {total / elapsed:9.1f} episodes/s  "
+          f"({len(result['failed'])} failed)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('episodes', type=int, nargs='*', default=[10, 100, 1000])
+    parser.add_argument('--latency', type=float, default=20, help='ms per response')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--padding', type=int, default=0, help='filler blocks per HTML page')
+    parser.add_argument('--segments', type=int, default=3)
+    parser.add_argument('--segment-bytes', type=int, default=188 * 64)
+    parser.add_argument('--rate', type=float, default=1000.0,
+                        help='requests/s per host; the fixture serves everything from one host')
+    args = parser.parse_args()
+
+    request_policy.RATE_PER_HOST = args.rate
+    request_policy.BURST_PER_HOST = max(int(args.rate), 1)
+
+    config = server.RequestHandlerClass.config
+    config.latency = args.latency / 1000
+    config.error_rate = args.error_rate
+    config.padding = args.padding
+    config.segments = args.segments
+    config.segment_bytes = args.segment_bytes
+
+    extractor.logger.setLevel(logging.WARNING)
+    scratch_dir = tempfile.mkdtemp(prefix='ani-tool-bench-')
+    if not use_scratch_dirs(scratch_dir):
+        print("ffmpeg not found: the remux step is skipped, downloads cover the segment transfer only.")
+
+    try:
+        for episodes in args.episodes:
+            bench_series(episodes)
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""HTML fixture pages shaped like the aniworld.to markup the scrapers read."""
+
+LANGUAGES = [
+    ('1', 'Deutsch'),
+    ('3', 'mit Untertitel Deutsch'),
+]
+
+HOSTERS = ['VOE', 'Doodstream', 'Vidoza']
+
+def episode_page(season, episode, padding=0):
+    """Episode page with a changeLanguageBox and one hoster li per language and hoster."""
+    language_images = ''.join(
+        f'<img src="/public/img/{key}.svg" data-lang-key="{key}" title="{title}">'
+        for key, title in LANGUAGES
+    )
+    hoster_items = []
+    link_id = (season * 10000 + episode) * 100
+    for key, _ in LANGUAGES:
+        for hoster in HOSTERS:
+            link_id += 1
+            hoster_items.append(
+                f'<li class="col-md-3 col-xs-12 col-sm-6 episodeLink{link_id}" data-lang-key="{key}" '
+                f'data-link-id="{link_id}" data-link-target="/redirect/{link_id}">'
+                f'<div><a class="watchEpisode" href="/redirect/{link_id}" target="_blank">'
+                f'<i class="icon {hoster}" title="Hoster {hoster}"></i><h4>{hoster}</h4>'
+                f'<div class="hosterSiteVideoButton">Video ansehen</div></a></div></li>'
+            )
+    filler = '<p class="filler">' + 'lorem ipsum ' * 20 + '</p>'
+    return (
+        '<!doctype html><html lang="de"><head><title>Episode</title></head><body>'
+        '<div id="wrapper"><div class="container">'
+        + filler * padding +
+        f'<div class="hosterSiteTitle"><h2>Staffel {season} Episode {episode}</h2></div>'
+        f'<div class="changeLanguageBox">{language_images}</div>'
+        f'<div class="hosterSiteVideo"><ul class="row">{"".join(hoster_items)}</ul></div>'
+        + filler * padding +
+        '</div></div></body></html>'
+    )
+
+LANGUAGE_FLAGS = [
+    ('german', 'Deutsch/German'),
+    ('japanese-german', 'Mit deutschem Untertitel'),
+]
+
+def _filler(padding):
+    return ('<p class="filler">' + 'lorem ipsum ' * 20 + '</p>') * padding
+
+def _episode_row(number, title, link):
+    flags = ''.join(f'<img class="flag" src="/public/img/{name}.svg" title="{title_}">' for name, title_ in LANGUAGE_FLAGS)
+    icons = ''.join(f'<i class="icon {hoster}" title="{hoster}"></i>' for hoster in HOSTERS)
+    return (
+        f'<tr class="" data-episode-id="{number}" itemscope itemprop="episode" itemtype="http://schema.org/Episode">'
+        f'<td class="season1EpisodeID"><meta itemprop="episodeNumber" content="{number}"><a itemprop="url" href="{link}">Folge {number}</a></td>'
+        f'<td class="seasonEpisodeTitle"><a href="{link}"><strong>{title}</strong> - <span>{title} (JP)</span></a></td>'
+        f'<td><a href="{link}">{icons}</a></td>'
+        f'<td class="editFunctions"><a href="{link}">{flags}</a></td></tr>'
+    )
+
+def series_page(name, seasons, has_movies=True, padding=0):
+    """Series page with the title and numberOfSeasons meta (which counts the movies as a season)."""
+    return (
+        '<!doctype html><html lang="de"><head><title>Series</title></head><body>'
+        '<div class="series-title"><h1 itemprop="name"><span>' + name + '</span></h1></div>'
+        f'<meta itemprop="numberOfSeasons" content="{seasons + (1 if has_movies else 0)}">'
+        + _filler(padding) +
+        '</body></html>'
+    )
+
+def season_page(series_path, season, episodes, padding=0):
+    """/staffel-N page with the tbody#seasonN episode table."""
+    rows = ''.join(
+        _episode_row(number, f"Episode {number}", f"{series_path}/staffel-{season}/episode-{number}")
+        for number in range(1, episodes + 1)
+    )
+    return (
+        '<!doctype html><html lang="de"><head><title>Staffel</title></head><body>'
+        + _filler(padding) +
+        f'<table class="seasonEpisodesList" data-season-id="{season}"><tbody id="season{season}">{rows}</tbody></table>'
+        + _filler(padding) +
+        '</body></html>'
+    )
+
+def movies_page(series_path, movies, padding=0):
+    """/filme page listing the movies as episode rows."""
+    rows = ''.join(
+        _episode_row(number, f"Movie {number}", f"{series_path}/filme/film-{number}")
+        for number in range(1, movies + 1)
+    )
+    return (
+        '<!doctype html><html lang="de"><head><title>Filme</title></head><body>'
+        + _filler(padding) +
+        f'<table class="seasonEpisodesList"><tbody id="season0">{rows}</tbody></table>'
+        '</body></html>'
+    )
+
+def catalog_page(names, padding=0):
+    """/animes page with every series grouped by genre inside div#seriesContainer."""
+    genres = {}
+    for index, name in enumerate(names):
+        genres.setdefault(['Action', 'Drama', 'Comedy', 'Fantasy'][index % 4], []).append(name)
+    blocks = ''.join(
+        f'<div class="genre"><div class="seriesGenreList"><h3>{genre}</h3></div><ul>'
+        + ''.join(
+            f'<li><a data-alternative-title="" href="/anime/stream/{name.lower().replace(" ", "-")}" title="{name} Stream anschauen">{name}</a></li>'
+            for name in genre_names
+        )
+        + '</ul></div>'
+        for genre, genre_names in genres.items()
+    )
+    return (
+        '<!doctype html><html lang="de"><head><title>Animes</title></head><body>'
+        + _filler(padding) +
+        f'<div id="seriesContainer">{blocks}</div>'
+        '</body></html>'
+    )
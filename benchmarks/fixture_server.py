@@ -0,0 +1,229 @@
+"""Local stand-in for aniworld.to and VOE, serving synthetic series with configurable latency, errors and sizes.
+
+Every /anime/stream/<slug> is a series with the configured number of seasons, episodes and
+movies. Hoster links go through /redirect/<id> hops; VOE links end on a page with a JS
+window.location.href redirect to a player page that embeds the m3u8 URL, whose playlist
+points at generated TS segments.
+
+Usage: python benchmarks/fixture_server.py [--port 8000] [--seasons 2] [--episodes 12] ...
+Then run the tool against it with ANI_TOOL_BASE_URL=http://127.0.0.1:8000
+"""
+import argparse
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from fixture_pages import HOSTERS, catalog_page, episode_page, movies_page, season_page, series_page
+
+SEGMENT_DURATION = 10.0
+
+class FixtureConfig:
+    """Shape of the synthetic site and how badly it behaves."""
+
+    def __init__(self, seasons=1, episodes=10, movies=0, catalog_size=100, latency=0.0, jitter=0.0,
+                 error_rate=0.0, padding=0, redirect_hops=1, segments=3, segment_bytes=188 * 64):
+        self.seasons = seasons
+        self.episodes = episodes            # Episodes per season
+        self.movies = movies
+        self.catalog_size = catalog_size    # Series listed on /animes
+        self.latency = latency              # Seconds added to every response
+        self.jitter = jitter                # Up to this many extra seconds, random per response
+        self.error_rate = error_rate        # Share of requests answered with 503
+        self.padding = padding              # Filler blocks that make the HTML pages bigger
+        self.redirect_hops = redirect_hops  # /redirect/<id> hops before the hoster page
+        self.segments = segments            # TS segments per stream
+        self.segment_bytes = segment_bytes
+
+def hoster_of(link_id):
+    """Hoster name of a link id generated by fixture_pages.episode_page."""
+    return HOSTERS[(link_id % 100 - 1) % len(HOSTERS)]
+
+def media_playlist(link_id, config):
+    lines = ['#EXTM3U', '#EXT-X-VERSION:3', f'#EXT-X-TARGETDURATION:{int(SEGMENT_DURATION)}', '#EXT-X-MEDIA-SEQUENCE:0']
+    for number in range(config.segments):
+        lines.append(f'#EXTINF:{SEGMENT_DURATION:.3f},')
+        lines.append(f'/hls/{link_id}/seg-{number}.ts')
+    lines.append('#EXT-X-ENDLIST')
+    return '\n'.join(lines) + '\n'
+
+def segment_bytes(link_id, number, size):
+    """Deterministic MPEG-TS sized payload: 188 byte packets starting with the sync byte."""
+    packet = bytes([0x47]) + f'{link_id}:{number}:'.encode('ascii').ljust(187, b'\xff')
+    return (packet * (size // 188 + 1))[:size]
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """Routes the aniworld and VOE URLs the scrapers and downloader request."""
+    config = FixtureConfig()
+    protocol_version = 'HTTP/1.1'
+
+    ROUTES = [
+        (re.compile(r'^/animes/?$'), 'catalog'),
+        (re.compile(r'^/anime/stream/([^/]+)/?$'), 'series'),
+        (re.compile(r'^/anime/stream/([^/]+)/filme/?$'), 'movies'),
+        (re.compile(r'^/anime/stream/([^/]+)/staffel-(\d+)/?$'), 'season'),
+        (re.compile(r'^/anime/stream/([^/]+)/staffel-(\d+)/episode-(\d+)/?$'), 'episode'),
+        (re.compile(r'^/anime/stream/([^/]+)/filme/film-(\d+)/?$'), 'movie'),
+        (re.compile(r'^/redirect/(\d+)(?:/(\d+))?$'), 'redirect'),
+        (re.compile(r'^/voe/(\d+)$'), 'voe'),
+        (re.compile(r'^/e/(\d+)$'), 'player'),
+        (re.compile(r'^/hoster/(\d+)$'), 'hoster'),
+        (re.compile(r'^/hls/(\d+)/master\.m3u8$'), 'master'),
+        (re.compile(r'^/hls/(\d+)/index\.m3u8$'), 'playlist'),
+        (re.compile(r'^/hls/(\d+)/seg-(\d+)\.ts$'), 'segment'),
+    ]
+
+    def do_GET(self):
+        config = self.config
+        time.sleep(config.latency + random.uniform(0, config.jitter))
+        if config.error_rate and random.random() < config.error_rate:
+            return self.send_body(503, b'Service Unavailable', 'text/plain')
+
+        path = self.path.split('?', 1)[0]
+        for pattern, name in self.ROUTES:
+            match = pattern.match(path)
+            if match:
+                return getattr(self, f'serve_{name}')(*match.groups())
+        self.send_body(404, b'Not Found', 'text/plain')
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def base_url(self):
+        return f"http://{self.headers.get('Host') or '%s:%d' % self.server.server_address[:2]}"
+
+    def send_body(self, status, body, content_type, headers=None):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def send_html(self, page):
+        self.send_body(200, page, 'text/html; charset=utf-8')
+
+    def serve_catalog(self):
+        names = ['Benchmark Series'] + [f'Synthetic Anime {number}' for number in range(1, self.config.catalog_size)]
+        self.send_html(catalog_page(names, self.config.padding))
+
+    def serve_series(self, slug):
+        name = slug.replace('-', ' ').title()
+        self.send_html(series_page_with_movies(name, slug, self.config))
+
+    def serve_movies(self, slug):
+        self.send_html(movies_page(f'/anime/stream/{slug}', self.config.movies, self.config.padding))
+
+    def serve_season(self, slug, season):
+        season = int(season)
+        if not 1 <= season <= self.config.seasons:
+            return self.send_body(404, b'Not Found', 'text/plain')
+        self.send_html(season_page(f'/anime/stream/{slug}', season, self.config.episodes, self.config.padding))
+
+    def serve_episode(self, slug, season, episode):
+        self.send_html(episode_page(int(season), int(episode), self.config.padding))
+
+    def serve_movie(self, slug, number):
+        self.send_html(episode_page(0, int(number), self.config.padding))
+
+    def serve_redirect(self, link_id, hop):
+        hop = int(hop or 0) + 1
+        if hop < self.config.redirect_hops:
+            target = f'/redirect/{link_id}/{hop}'
+        elif hoster_of(int(link_id)) == 'VOE':
+            target = f'/voe/{link_id}'
+        else:
+            target = f'/hoster/{link_id}'
+        self.send_body(302, b'', 'text/plain', {'Location': self.base_url() + target})
+
+    def serve_voe(self, link_id):
+        self.send_html(
+            '<!doctype html><html><head><title>VOE</title>'
+            f"<script>window.location.href = '{self.base_url()}/e/{link_id}';</script>"
+            '</head><body>Redirecting...</body></html>'
+        )
+
+    def serve_player(self, link_id):
+        # Signed like the real thing: s = signing time, e = lifetime in seconds
+        m3u8_url = f"{self.base_url()}/hls/{link_id}/master.m3u8?t=fixture&s={int(time.time())}&e=14400"
+        self.send_html(
+            '<!doctype html><html><head><title>Player</title></head><body><div id="player"></div>'
+            f"<script>var sources = {{'hls': '{m3u8_url}', 'video_height': 720}};</script>"
+            '</body></html>'
+        )
+
+    def serve_hoster(self, link_id):
+        self.send_html(f'<!doctype html><html><body>{hoster_of(int(link_id))} player {link_id}</body></html>')
+
+    def serve_master(self, link_id):
+        playlist = (
+            '#EXTM3U\n'
+            '#EXT-X-STREAM-INF:BANDWIDTH=800000,RESOLUTION=854x480\nindex.m3u8?q=480\n'
+            '#EXT-X-STREAM-INF:BANDWIDTH=2400000,RESOLUTION=1280x720\nindex.m3u8?q=720\n'
+        )
+        self.send_body(200, playlist, 'application/vnd.apple.mpegurl')
+
+    def serve_playlist(self, link_id):
+        self.send_body(200, media_playlist(link_id, self.config), 'application/vnd.apple.mpegurl')
+
+    def serve_segment(self, link_id, number):
+        if int(number) >= self.config.segments:
+            return self.send_body(404, b'Not Found', 'text/plain')
+        self.send_body(200, segment_bytes(link_id, int(number), self.config.segment_bytes), 'video/mp2t')
+
+    def log_message(self, format, *args):
+        pass
+
+def series_page_with_movies(name, slug, config):
+    """Series page that links its /filme section when the series has movies, like the real site."""
+    page = series_page(name, config.seasons, has_movies=bool(config.movies), padding=config.padding)
+    links = ''.join(f'<li><a href="/anime/stream/{slug}/staffel-{number}">{number}</a></li>' for number in range(1, config.seasons + 1))
+    if config.movies:
+        links = f'<li><a href="/anime/stream/{slug}/filme">Filme</a></li>' + links
+    return page.replace('</body>', f'<div id="stream"><ul>{links}</ul></div></body>')
+
+def start_server(config=None, host='127.0.0.1', port=0):
+    """Start the fixture server in a background thread; returns (server, base_url)."""
+    handler = type('ConfiguredFixtureHandler', (FixtureHandler,), {'config': config or FixtureConfig()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+def main():
+    parser = argparse.ArgumentParser(description='Local aniworld/VOE stand-in for offline benchmarks')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--seasons', type=int, default=2)
+    parser.add_argument('--episodes', type=int, default=12, help='episodes per season')
+    parser.add_argument('--movies', type=int, default=1)
+    parser.add_argument('--catalog-size', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds per response')
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of 503 responses')
+    parser.add_argument('--padding', type=int, default=0, help='filler blocks per HTML page')
+    parser.add_argument('--redirect-hops', type=int, default=1)
+    parser.add_argument('--segments', type=int, default=3)
+    parser.add_argument('--segment-bytes', type=int, default=188 * 64)
+    args = parser.parse_args()
+
+    config = FixtureConfig(
+        seasons=args.seasons, episodes=args.episodes, movies=args.movies, catalog_size=args.catalog_size,
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, padding=args.padding,
+        redirect_hops=args.redirect_hops, segments=args.segments, segment_bytes=args.segment_bytes,
+    )
+    server, base_url = start_server(config, port=args.port)
+    print(f"Serving {config.seasons} seasons x {config.episodes} episodes, {config.movies} movies at {base_url}")
+    print(f"Run the tool with ANI_TOOL_BASE_URL={base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
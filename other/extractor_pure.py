@@ -1,26 +1,25 @@
 import os
+import sys
 import json
-import requests
+import httpx
 from bs4 import BeautifulSoup
-import time
 
-BASE_URL = 'https://aniworld.to'
+# Share the HTTP transport with the scrapers in /scripts
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts')
+if SCRIPTS_DIR not in sys.path:
+    sys.path.append(SCRIPTS_DIR)
+
+import config
+import http_client
+import redirects
+
+BASE_URL = config.BASE_URL
 
 def follow_redirect_and_get_final_url(redirect_url, debug=False):
-    """Follow the redirect URL and return the final destination URL."""
-    try:
-        if debug:
-            print(f"Visiting redirect URL: {redirect_url}")
-        
-        response = requests.get(redirect_url, timeout=10, allow_redirects=True)
-        # Get the final URL after the redirect
-        final_url = response.url
-        if debug:
-            print(f"Final redirected URL: {final_url}")
-        return final_url
-    except requests.RequestException as e:
-        print(f"Failed to follow redirect for {redirect_url}: {e}")
-        return None
+    """Follow the redirect URL and return the final destination URL (cached across runs)."""
+    if debug:
+        print(f"Visiting redirect URL: {redirect_url}")
+    return redirects.resolve(redirect_url, debug=debug)
 
 def extract_movie_stream_links(movie_url, debug=False):
     """Extract streaming services and language options for a movie."""
@@ -32,20 +31,9 @@ def extract_movie_stream_links(movie_url, debug=False):
         if not movie_url.startswith(BASE_URL):
             movie_url = f"{BASE_URL}{movie_url}"
 
-        # Retry mechanism in case of network issues
-        max_retries = 3
-        for _ in range(max_retries):
-            try:
-                response = requests.get(movie_url, timeout=10)
-                response.raise_for_status()
-                break
-            except requests.RequestException as e:
-                if debug:
-                    print(f"Error fetching {movie_url}, retrying...: {e}")
-                time.sleep(2)
-        else:
-            print(f"Failed to fetch {movie_url} after {max_retries} retries.")
-            return {}
+        # Network errors, 429 and 5xx are retried with backoff by the request policy
+        response = http_client.get(movie_url)
+        response.raise_for_status()
 
         # Process the HTML response
         soup = BeautifulSoup(response.text, 'html.parser')
@@ -66,24 +54,25 @@ def extract_movie_stream_links(movie_url, debug=False):
 
         # Find available streaming services for each language
         services = {}
-        episode_links = soup.find_all('li', class_=['col-md-3', 'col-xs-12', 'col-sm-6'])
-        for link in episode_links:
-            lang_key = link.get('data-lang-key')
+        episode_links = []
+        for link in soup.find_all('li', class_=['col-md-3', 'col-xs-12', 'col-sm-6']):
             link_target = link.get('data-link-target')  # Check if 'data-link-target' exists
-            if link_target:
-                redirect_url = BASE_URL + link_target  # Full URL for the redirect
-                service_name = link.find('h4').get_text(strip=True) if link.find('h4') else 'Unknown'
-
-                # Follow the redirect to get the final streaming URL
-                final_url = follow_redirect_and_get_final_url(redirect_url, debug)
-                
-                if lang_key in languages and final_url:
-                    if lang_key not in services:
-                        services[lang_key] = []
-                    services[lang_key].append({
-                        'service_name': service_name,
-                        'stream_url': final_url  # Save the final URL after the redirect
-                    })
+            if link_target and link.get('data-lang-key') in languages:
+                episode_links.append((link, BASE_URL + link_target))  # Full URL for the redirect
+
+        # Follow all redirects at once, without downloading the hoster pages
+        final_urls = redirects.resolve_all([redirect_url for _, redirect_url in episode_links], debug=debug)
+        for link, redirect_url in episode_links:
+            lang_key = link.get('data-lang-key')
+            service_name = link.find('h4').get_text(strip=True) if link.find('h4') else 'Unknown'
+            final_url = final_urls[redirect_url]
+            if final_url:
+                if lang_key not in services:
+                    services[lang_key] = []
+                services[lang_key].append({
+                    'service_name': service_name,
+                    'stream_url': final_url  # Save the final URL after the redirect
+                })
 
         if debug:
             print(f"Services found: {services}")
@@ -95,7 +84,7 @@ def extract_movie_stream_links(movie_url, debug=False):
 
         return movie_data
 
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"Failed to extract data from {movie_url}: {e}")
         return {}
 
@@ -130,6 +119,7 @@ def process_movies_from_json(json_file, debug=False):
     except FileNotFoundError:
         print(f"File {json_file} not found.")
 
-# Example usage
-json_file = 'one-piece.json'  # Replace with the correct JSON file in your directory
-process_movies_from_json(json_file, debug=True)
+if __name__ == "__main__":
+    # Example usage
+    json_file = 'one-piece.json'  # Replace with the correct JSON file in your directory
+    process_movies_from_json(json_file, debug=True)
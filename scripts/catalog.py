@@ -0,0 +1,210 @@
+import os
+import re
+import json
+import time
+import threading
+import unicodedata
+from collections import Counter
+import httpx
+
+import config
+import http_cache
+import html_parser
+
+# Constants
+base_url = config.BASE_URL
+CATALOG_DIR = os.path.join(config.DATA_DIR, 'catalog')
+SNAPSHOT_PATH = os.path.join(CATALOG_DIR, 'catalog.json')
+SNAPSHOT_MAX_AGE = 24 * 60 * 60  # Older snapshots are still used, but refreshed in the background
+
+MAX_PREFIX_LENGTH = 12  # Longer query tokens are matched on their first 12 characters
+MIN_FUZZY_SCORE = 0.3  # Minimum trigram similarity for a typo-tolerant match
+SEARCH_LIMIT = 25  # Results shown in the search menu
+
+# Romanization variants that should search the same ("Shingeki no Kyoujin" vs "Kyojin")
+TRANSLITERATIONS = [
+    ('ß', 'ss'),
+    ('ou', 'o'),
+    ('oo', 'o'),
+    ('uu', 'u'),
+    ('aa', 'a'),
+    ('ii', 'i'),
+    ('ee', 'e'),
+]
+
+def normalize(text):
+    """Lowercase, strip accents, fold romanization variants and punctuation into single spaces."""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    for source, target in TRANSLITERATIONS:
+        text = text.replace(source, target)
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', text).split())
+
+def trigrams(normalized):
+    """Set of character trigrams of a normalized string, padded so short words still produce some."""
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class CatalogIndex:
+    """In-memory search index over the catalog entries (prefix and trigram lookups)."""
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.names = [normalize(entry['name']) for entry in entries]
+        self.prefixes = {}
+        self.trigram_index = {}
+        self.trigram_counts = []
+
+        for entry_id, name in enumerate(self.names):
+            for token in name.split():
+                for length in range(1, min(len(token), MAX_PREFIX_LENGTH) + 1):
+                    self.prefixes.setdefault(token[:length], set()).add(entry_id)
+            name_trigrams = trigrams(name)
+            self.trigram_counts.append(len(name_trigrams))
+            for trigram in name_trigrams:
+                self.trigram_index.setdefault(trigram, []).append(entry_id)
+
+    def search(self, search_term, limit=None):
+        """Return the entries matching search_term, best match first."""
+        query = normalize(search_term)
+        if not query:
+            return []
+
+        scores = {}
+
+        # Exact token prefixes: every query token must start some token of the name
+        prefix_ids = None
+        for token in query.split():
+            ids = self.prefixes.get(token[:MAX_PREFIX_LENGTH], set())
+            prefix_ids = ids if prefix_ids is None else prefix_ids & ids
+            if not prefix_ids:
+                break
+        for entry_id in prefix_ids or ():
+            name = self.names[entry_id]
+            scores[entry_id] = 3.0 + (name == query) + name.startswith(query)
+
+        # Prefix matches always outrank fuzzy ones, so stop early once the limit is filled
+        if limit is not None and len(scores) >= limit:
+            ranked = sorted(scores, key=lambda entry_id: (-scores[entry_id], self.names[entry_id]))
+            return [self.entries[entry_id] for entry_id in ranked[:limit]]
+
+        # Trigram similarity tolerates typos and catches substrings inside words
+        query_trigrams = trigrams(query)
+        overlaps = Counter()
+        for trigram in query_trigrams:
+            overlaps.update(self.trigram_index.get(trigram, ()))
+        for entry_id, overlap in overlaps.items():
+            if entry_id in scores:
+                continue
+            if query in self.names[entry_id]:
+                scores[entry_id] = 2.0
+                continue
+            similarity = overlap / (len(query_trigrams) + self.trigram_counts[entry_id] - overlap)
+            if similarity >= MIN_FUZZY_SCORE:
+                scores[entry_id] = similarity
+
+        ranked = sorted(scores, key=lambda entry_id: (-scores[entry_id], self.names[entry_id]))
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [self.entries[entry_id] for entry_id in ranked]
+
+def scrape_catalog():
+    """Scrape the full anime list from the /animes page."""
+    url = f'{base_url}/animes'
+    response = http_cache.get(url)
+    response.raise_for_status()
+    return parse_catalog(response.text)
+
+def parse_catalog(page_html, parser=None, parse_only=html_parser.CATALOG_PAGE):
+    """Parse the anime entries of the /animes page."""
+    soup = html_parser.make_soup(page_html, parse_only, parser)
+
+    entries = []
+    series_container = soup.find('div', id='seriesContainer')
+    if not series_container:
+        print("Could not find the anime list on the webpage.")
+        return entries
+
+    genres = series_container.find_all('div', class_='genre')
+    for genre in genres:
+        genre_name = genre.find('h3').text.strip()
+        anime_items = genre.find_all('li')
+
+        for anime_item in anime_items:
+            anime_name = anime_item.text.strip()
+            anime_url = anime_item.find('a')['href']
+            full_anime_url = f"{base_url}{anime_url}"
+            entries.append({
+                'name': anime_name,
+                'genre': genre_name,
+                'url': full_anime_url
+            })
+    return entries
+
+def load_snapshot():
+    """Return (entries, fetched_at) from the snapshot on disk, or (None, 0) if there is none."""
+    try:
+        with open(SNAPSHOT_PATH, 'r', encoding='utf-8') as snapshot_file:
+            snapshot = json.load(snapshot_file)
+        return snapshot['entries'], snapshot['fetched_at']
+    except (OSError, ValueError, KeyError):
+        return None, 0
+
+def save_snapshot(entries):
+    """Write the catalog snapshot atomically."""
+    os.makedirs(CATALOG_DIR, exist_ok=True)
+    tmp_path = f"{SNAPSHOT_PATH}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as snapshot_file:
+        json.dump({'fetched_at': time.time(), 'entries': entries}, snapshot_file, ensure_ascii=False)
+    os.replace(tmp_path, SNAPSHOT_PATH)
+
+_index = CatalogIndex([])
+_index_lock = threading.Lock()
+_refresh_thread = None
+
+def _set_entries(entries):
+    global _index
+    index = CatalogIndex(entries)
+    with _index_lock:
+        _index = index
+
+def refresh_catalog():
+    """Scrape the catalog, save the snapshot and swap in the new index."""
+    entries = scrape_catalog()
+    if entries:
+        save_snapshot(entries)
+        _set_entries(entries)
+    return entries
+
+def refresh_in_background():
+    """Refresh the catalog on a daemon thread, unless a refresh is already running."""
+    global _refresh_thread
+
+    def refresh():
+        try:
+            refresh_catalog()
+        except httpx.HTTPError as e:
+            print(f"Background catalog refresh failed: {e}")
+
+    with _index_lock:
+        if _refresh_thread is not None and _refresh_thread.is_alive():
+            return
+        _refresh_thread = threading.Thread(target=refresh, daemon=True)
+        _refresh_thread.start()
+
+def load_catalog(max_age=SNAPSHOT_MAX_AGE):
+    """Load the catalog from the snapshot (refreshing stale ones in the background) or scrape it."""
+    entries, fetched_at = load_snapshot()
+    if entries is None:
+        return refresh_catalog()
+
+    _set_entries(entries)
+    if time.time() - fetched_at > max_age:
+        refresh_in_background()
+    return entries
+
+def search(search_term, limit=None):
+    """Search the loaded catalog, best match first."""
+    with _index_lock:
+        index = _index
+    return index.search(search_term, limit)
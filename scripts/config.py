@@ -0,0 +1,8 @@
+import os
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Persistent state goes into subfolders of DATA_DIR: main.clean_data_directory() only deletes the files directly in it
+DATA_DIR = os.path.join(BASE_DIR, 'data')
+
+# Site the scrapers talk to. Point it at a mirror, or at benchmarks/fixture_server.py for offline runs.
+BASE_URL = os.environ.get('ANI_TOOL_BASE_URL', 'https://aniworld.to').rstrip('/')
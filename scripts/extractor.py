@@ -1,21 +1,71 @@
-import os
-import json
-import requests
-from bs4 import BeautifulSoup
-import time
+import sys
+import httpx
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
 
-# Base URL for the website
-BASE_URL = 'https://aniworld.to'
+import config
+import http_cache
+import html_parser
+import library
+import metrics
+
+# Base URL for the website (ANI_TOOL_BASE_URL)
+BASE_URL = config.BASE_URL
+
+# Concurrency limits for fetching episode pages
+MAX_WORKERS = 8  # Episode pages in flight at once
+MAX_PER_HOST = 4  # Episode pages in flight per host, to stay polite
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(levelname)s | %(message)s')
 logger = logging.getLogger()
 
-# Paths
-BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
-DATA_DIR = os.path.join(BASE_DIR, 'ani-tool', 'data')
-os.makedirs(DATA_DIR, exist_ok=True)
+def parse_stream_links(page_html, debug=False, parser=None, parse_only=html_parser.EPISODE_PAGE):
+    """Parse the languages and hoster links of a movie or episode page."""
+    # Process the HTML response
+    soup = html_parser.make_soup(page_html, parse_only, parser)
+
+    # Find available languages by locating the images in the `changeLanguageBox` section
+    languages = {}
+    language_box = soup.find('div', class_='changeLanguageBox')
+    if language_box:
+        lang_images = language_box.find_all('img')
+        for lang in lang_images:
+            lang_title = lang.get('title', '').lower().replace(' ', '-')
+            lang_key = lang.get('data-lang-key')
+            if lang_title and lang_key:
+                languages[lang_key] = lang_title
+
+    if debug:
+        logger.info(f"Languages found: {languages}")
+
+    # Find available streaming services for each language
+    services = {}
+    episode_links = soup.find_all('li', class_=['col-md-3', 'col-xs-12', 'col-sm-6'])
+    for link in episode_links:
+        lang_key = link.get('data-lang-key')
+        link_url = link.get('data-link-target')  # The redirect link
+        service_name = link.find('h4').get_text(strip=True) if link.find('h4') else 'Unknown'
+
+        if lang_key in languages and link_url:
+            if lang_key not in services:
+                services[lang_key] = []
+            services[lang_key].append({
+                'service_name': service_name,
+                'stream_url': BASE_URL + link_url  # Full URL for the stream
+            })
+
+    if debug:
+        logger.info(f"Services found: {services}")
+
+    # Combine language options and their respective streaming services
+    content_data = {}
+    for lang_key, lang_name in languages.items():
+        content_data[lang_name] = services.get(lang_key, [])
+
+    return content_data
 
 def extract_stream_links(content_url, debug=False):
     """Extract streaming services and language options for a movie or episode."""
@@ -23,127 +73,101 @@ def extract_stream_links(content_url, debug=False):
         logger.info(f"Processing URL: {content_url}")
 
         # Ensure the URL starts with BASE_URL only if it's not already a full URL
-        if not content_url.startswith(BASE_URL):
+        if not content_url.startswith('http'):
             content_url = f"{BASE_URL}{content_url}"
 
-        # Retry mechanism in case of network issues with exponential backoff
-        max_retries = 3
-        delay = 2
-        for attempt in range(max_retries):
-            try:
-                response = requests.get(content_url, timeout=15)
-                response.raise_for_status()
-                break  # If successful, exit the loop
-            except requests.RequestException as e:
-                logger.warning(f"Error fetching {content_url}, retrying ({attempt + 1}/{max_retries}) in {delay} seconds...: {e}")
-                time.sleep(delay)
-                delay *= 2  # Exponential backoff
-        else:
-            logger.error(f"Failed to fetch {content_url} after {max_retries} retries.")
-            return {}
-
-        # Process the HTML response
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        # Find available languages by locating the images in the `changeLanguageBox` section
-        languages = {}
-        language_box = soup.find('div', class_='changeLanguageBox')
-        if language_box:
-            lang_images = language_box.find_all('img')
-            for lang in lang_images:
-                lang_title = lang.get('title', '').lower().replace(' ', '-')
-                lang_key = lang.get('data-lang-key')
-                if lang_title and lang_key:
-                    languages[lang_key] = lang_title
-
-        if debug:
-            logger.info(f"Languages found: {languages}")
-
-        # Find available streaming services for each language
-        services = {}
-        episode_links = soup.find_all('li', class_=['col-md-3', 'col-xs-12', 'col-sm-6'])
-        for link in episode_links:
-            lang_key = link.get('data-lang-key')
-            link_url = link.get('data-link-target')  # The redirect link
-            service_name = link.find('h4').get_text(strip=True) if link.find('h4') else 'Unknown'
-
-            if lang_key in languages and link_url:
-                if lang_key not in services:
-                    services[lang_key] = []
-                services[lang_key].append({
-                    'service_name': service_name,
-                    'stream_url': BASE_URL + link_url  # Full URL for the stream
-                })
-
-        if debug:
-            logger.info(f"Services found: {services}")
-
-        # Combine language options and their respective streaming services
-        content_data = {}
-        for lang_key, lang_name in languages.items():
-            content_data[lang_name] = services.get(lang_key, [])
-
-        return content_data
-
-    except requests.RequestException as e:
+        # Network errors, 429 and 5xx are retried with backoff by the request policy
+        response = http_cache.get(content_url)
+        response.raise_for_status()
+        return parse_stream_links(response.text, debug)
+
+    except httpx.HTTPError as e:
         logger.error(f"Failed to extract data from {content_url}: {e}")
+        metrics.count_failure('extract')
         return {}
 
-def process_content_from_json(json_file, debug=False):
-    """Process movies and episodes from the JSON file and extract streaming links."""
-    try:
-        # Open and load the JSON file from the data directory
-        json_path = os.path.join(DATA_DIR, json_file)
-        with open(json_path, 'r', encoding='utf-8') as file:
-            anime_data = json.load(file)
-
-        content_links_data = {}
-        processed_count = 0  # Track the number of processed movies/episodes
-
-        # Process Movies
-        movie_list = anime_data.get('movies', {}).get('movie_list', [])
-        if movie_list:
-            logger.info(f"Processing {len(movie_list)} movies...")
-            for movie in movie_list:
-                movie_number = movie['movie_number']
-                movie_title = f"S0E{movie_number} - {movie['movie_name']}"  # Formatting as S0E1 for movies
-                movie_url = movie['movie_url']
-                logger.info(f"Fetching data for movie: {movie_title}...")
-
-                # Extract stream links for this movie
-                movie_links = extract_stream_links(movie_url, debug)
-                content_links_data[movie_title] = movie_links
-
-                processed_count += 1
-
-        # Process Seasons and Episodes
-        seasons = anime_data.get('seasons', {})
-        for season_name, season_data in seasons.items():
-            episodes = season_data.get('episodes', {})
-            logger.info(f"Processing {len(episodes)} episodes in {season_name}...")
-            season_number = season_name.split(' ')[1]  # Extracting season number
-            for episode_id, episode_data in episodes.items():
-                episode_title = f"S{season_number}E{episode_id[1:]} - {episode_data['episode_title']}"  # Formatting as S1E1
-                episode_url = episode_data['episode_url']
-                logger.info(f"Fetching data for episode: {episode_title}...")
-
-                # Extract stream links for this episode
-                episode_links = extract_stream_links(episode_url, debug)
-                content_links_data[episode_title] = episode_links
-
-                processed_count += 1
-
-        # Save the extracted movie and episode links to a new JSON file in the data directory
-        output_file = os.path.join(DATA_DIR, f"extracted_{json_file}")
-        with open(output_file, 'w', encoding='utf-8') as outfile:
-            json.dump(content_links_data, outfile, ensure_ascii=False, indent=4)
-        logger.info(f"Extracted data saved to {output_file}")
-
-    except FileNotFoundError:
-        logger.error(f"File {json_file} not found in {DATA_DIR}.")
-    except json.JSONDecodeError:
-        logger.error(f"Failed to parse JSON in {json_file}.")
-
-# Example usage
-json_file = 'data.json'  # The JSON file must be located in the 'data' directory
-process_content_from_json(json_file, debug=True)
+def list_content_pages(anime_data):
+    """List (title, url) for every movie and episode in the anime data dict, in S/E order."""
+    content_pages = []
+
+    # Movies
+    movie_list = anime_data.get('movies', {}).get('movie_list', [])
+    for movie in movie_list:
+        movie_title = f"S0E{movie['movie_number']} - {movie['movie_name']}"  # Formatting as S0E1 for movies
+        content_pages.append((movie_title, movie['movie_url']))
+
+    # Seasons and Episodes
+    seasons = anime_data.get('seasons', {})
+    for season_name, season_data in seasons.items():
+        season_number = season_name.split(' ')[1]  # Extracting season number
+        for episode_id, episode_data in season_data.get('episodes', {}).items():
+            episode_title = f"S{season_number}E{episode_id[1:]} - {episode_data['episode_title']}"  # Formatting as S1E1
+            content_pages.append((episode_title, episode_data['episode_url']))
+
+    return content_pages
+
+def iter_content_links(content_pages, debug=False, max_workers=MAX_WORKERS, max_per_host=MAX_PER_HOST):
+    """Yield (title, links) for every (title, url) in content_pages, in the same order.
+
+    Pages are fetched by up to max_workers threads, with at most max_per_host
+    requests in flight against the same host. Each result is yielded as soon as
+    it and the ones before it are done.
+    """
+    logger.info(f"Processing {len(content_pages)} movies and episodes...")
+
+    host_limits = {}
+    host_limits_lock = threading.Lock()
+
+    def fetch_page_links(content_page):
+        content_title, content_url = content_page
+        host = urlparse(content_url).netloc or BASE_URL
+        with host_limits_lock:
+            host_limit = host_limits.setdefault(host, threading.Semaphore(max_per_host))
+        with host_limit:
+            logger.info(f"Fetching data for: {content_title}...")
+            return extract_stream_links(content_url, debug)
+
+    if max_workers <= 1:
+        for content_page in content_pages:
+            yield content_page[0], fetch_page_links(content_page)
+        return
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # map() yields in submission order, so the output keeps the S/E order
+        for (content_title, _), links in zip(content_pages, executor.map(fetch_page_links, content_pages)):
+            yield content_title, links
+
+def extract_content_links(anime_data, debug=False, max_workers=MAX_WORKERS, max_per_host=MAX_PER_HOST):
+    """Extract streaming links for every movie and episode in the anime data dict (see iter_content_links)."""
+    return dict(iter_content_links(list_content_pages(anime_data), debug, max_workers, max_per_host))
+
+def extract_anime(anime_url, debug=False, max_workers=MAX_WORKERS, max_per_host=MAX_PER_HOST):
+    """Extract the streaming links of every episode of a series in the library that was not extracted yet.
+
+    Each episode is stored as soon as it is done, so voe_extract can resolve it while this
+    runs and an interrupted run continues where it stopped. Failed pages are tried again
+    on the next run.
+    """
+    store = library.Library()
+    anime = store.anime(anime_url)
+    if anime is None:
+        logger.error(f"{anime_url} is not in the library, run info_getter.py first.")
+        return
+
+    episodes = store.unextracted(anime['id'])
+    episode_ids = {}
+    content_pages = []
+    for episode in episodes:
+        content_title = library.content_title(episode['season'], episode['number'], episode['title'])
+        episode_ids[content_title] = episode['id']
+        content_pages.append((content_title, episode['url']))
+
+    for content_title, links in iter_content_links(content_pages, debug, max_workers, max_per_host):
+        store.save_links(episode_ids[content_title], links)
+    store.mark_done(anime['id'], 'extracted')
+    store.close()
+    logger.info(f"Extracted links of {len(content_pages)} movies and episodes saved to {library.DB_PATH}")
+
+if __name__ == "__main__":
+    # Example usage: python extractor.py /anime/stream/death-note (after info_getter.py)
+    extract_anime(sys.argv[1] if len(sys.argv) > 1 else '/anime/stream/death-note', debug=True)
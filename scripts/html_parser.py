@@ -0,0 +1,24 @@
+import os
+import re
+import importlib.util
+from bs4 import BeautifulSoup, SoupStrainer
+
+# lxml is much faster than the pure-Python 'html.parser'; set ANI_TOOL_HTML_PARSER to override
+LXML_AVAILABLE = importlib.util.find_spec('lxml') is not None
+PARSER = os.environ.get('ANI_TOOL_HTML_PARSER', 'lxml' if LXML_AVAILABLE else 'html.parser')
+
+# Strainers: only the subtrees each scraper reads are turned into a tree, the rest is skipped
+# (while parsing, bs4 may see the class attribute as one unsplit string, hence the word-boundary regex)
+EPISODE_CLASSES = re.compile(r'(^|\s)(changeLanguageBox|col-md-3|col-xs-12|col-sm-6)(\s|$)')
+EPISODE_PAGE = SoupStrainer(['div', 'li'], attrs={'class': EPISODE_CLASSES})
+CATALOG_PAGE = SoupStrainer('div', id='seriesContainer')
+MOVIE_ROWS = SoupStrainer('tr', itemprop='episode')
+SCRIPT_TAGS = SoupStrainer('script')
+
+def season_table(season_number):
+    """Strainer for the episode table of a /staffel-N page."""
+    return SoupStrainer('tbody', id=f'season{season_number}')
+
+def make_soup(markup, parse_only=None, parser=None):
+    """Parse markup with the configured backend, optionally only the parts matched by parse_only."""
+    return BeautifulSoup(markup, parser or PARSER, parse_only=parse_only)
@@ -0,0 +1,165 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+import httpx
+
+import config
+import http_client
+
+# Paths
+CACHE_DIR = os.path.join(config.DATA_DIR, 'http_cache')
+
+# Set ANI_TOOL_HTTP_CACHE=0 to always go to the network (benchmarks do this)
+CACHE_ENABLED = os.environ.get('ANI_TOOL_HTTP_CACHE', '1') != '0'
+MAX_CACHE_BYTES = 256 * 1024 * 1024  # Least recently used entries are evicted above this size
+
+# Time-to-live per URL class, first match wins. URLs matching no rule are never cached.
+TTL_RULES = [
+    (re.compile(r'/animes/?$'), 60 * 60),  # Catalog page
+    (re.compile(r'/staffel-\d+/episode-\d+/?$'), 24 * 60 * 60),  # Episode pages
+    (re.compile(r'/filme/film-\d+/?$'), 24 * 60 * 60),  # Movie pages
+    (re.compile(r'/anime/stream/[^/]+(/staffel-\d+|/filme)?/?$'), 60 * 60),  # Series, season and movie list pages
+]
+
+_lock = threading.Lock()
+_cache_size = None  # Total body bytes on disk, computed on first store
+
+def ttl_for(url):
+    """Return the TTL in seconds for a URL, or None if the URL should not be cached."""
+    path = httpx.URL(url).path
+    for pattern, ttl in TTL_RULES:
+        if pattern.search(path):
+            return ttl
+    return None
+
+def _entry_paths(url):
+    key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+    return os.path.join(CACHE_DIR, f"{key}.json"), os.path.join(CACHE_DIR, f"{key}.body")
+
+def _load_entry(url):
+    meta_path, body_path = _entry_paths(url)
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as meta_file:
+            meta = json.load(meta_file)
+        with open(body_path, 'rb') as body_file:
+            body = body_file.read()
+    except (OSError, ValueError):
+        return None, None
+    return meta, body
+
+def _write_atomic(path, data, mode):
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, mode, **({} if 'b' in mode else {'encoding': 'utf-8'})) as tmp_file:
+        tmp_file.write(data)
+    os.replace(tmp_path, path)
+
+def _touch(url):
+    """Mark an entry as recently used; the meta file mtime is the LRU clock."""
+    meta_path, _ = _entry_paths(url)
+    try:
+        os.utime(meta_path, None)
+    except OSError:
+        pass
+
+def _store_entry(url, meta, body):
+    global _cache_size
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    meta_path, body_path = _entry_paths(url)
+    old_size = os.path.getsize(body_path) if os.path.exists(body_path) else 0
+    _write_atomic(body_path, body, 'wb')
+    _write_atomic(meta_path, json.dumps(meta), 'w')
+    with _lock:
+        if _cache_size is None:
+            _cache_size = _scan_cache_size()
+        else:
+            _cache_size += len(body) - old_size
+        if _cache_size > MAX_CACHE_BYTES:
+            _evict()
+
+def _scan_cache_size():
+    total = 0
+    for entry in os.scandir(CACHE_DIR):
+        if entry.name.endswith('.body'):
+            total += entry.stat().st_size
+    return total
+
+def _evict():
+    """Delete least recently used entries until the cache is back under 90% of its limit."""
+    global _cache_size
+    entries = []
+    for entry in os.scandir(CACHE_DIR):
+        if entry.name.endswith('.json'):
+            body_path = entry.path[:-len('.json')] + '.body'
+            try:
+                entries.append((entry.stat().st_mtime, entry.path, body_path, os.path.getsize(body_path)))
+            except OSError:
+                continue
+    entries.sort()
+    for _, meta_path, body_path, size in entries:
+        if _cache_size <= MAX_CACHE_BYTES * 0.9:
+            break
+        for path in (meta_path, body_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        _cache_size -= size
+
+def _cached_response(url, meta, body):
+    """Rebuild an httpx.Response from a cache entry."""
+    return httpx.Response(
+        status_code=200,
+        headers=meta.get('headers', {}),
+        content=body,
+        request=httpx.Request('GET', url),
+    )
+
+def get(url, **kwargs):
+    """GET a URL through the disk cache; uncacheable URLs go straight to the shared client."""
+    ttl = ttl_for(url) if CACHE_ENABLED else None
+    if ttl is None:
+        return http_client.get(url, **kwargs)
+
+    meta, body = _load_entry(url)
+    if meta is not None and time.time() - meta['fetched_at'] < ttl:
+        _touch(url)
+        return _cached_response(url, meta, body)
+
+    # Expired or missing: revalidate with the validators we have, if any
+    headers = dict(kwargs.pop('headers', None) or {})
+    if meta is not None:
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+    response = http_client.get(url, headers=headers, **kwargs)
+
+    if response.status_code == 304 and meta is not None:
+        meta['fetched_at'] = time.time()
+        _store_entry(url, meta, body)
+        return _cached_response(url, meta, body)
+
+    if response.status_code == 200:
+        meta = {
+            'url': url,
+            'fetched_at': time.time(),
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'headers': {'Content-Type': response.headers.get('Content-Type', 'text/html; charset=utf-8')},
+        }
+        _store_entry(url, meta, response.content)
+
+    return response
+
+def clear_cache():
+    """Delete every cached response."""
+    global _cache_size
+    with _lock:
+        if os.path.isdir(CACHE_DIR):
+            for entry in os.scandir(CACHE_DIR):
+                os.remove(entry.path)
+        _cache_size = 0
@@ -0,0 +1,73 @@
+import atexit
+import importlib.util
+import time
+import threading
+import httpx
+
+import metrics
+import request_policy
+
+# Shared transport settings for every scraper and resolver
+TIMEOUT = httpx.Timeout(30.0, connect=10.0)
+LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=60.0)
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36',
+    'Accept-Language': 'de-DE,de;q=0.9,en;q=0.8',
+}
+
+# HTTP/2 needs the optional 'h2' package (pip install httpx[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec('h2') is not None
+
+_client = None
+_client_lock = threading.Lock()
+
+def _start_timer(request):
+    request.extensions['ani_tool_started'] = time.perf_counter()
+
+def _record_response(response):
+    # Runs once the headers arrived, for every redirect hop as well
+    started = response.request.extensions.get('ani_tool_started')
+    if started is not None:
+        metrics.record_request(response.request.url.host, time.perf_counter() - started, response.status_code)
+
+def get_client():
+    """Return the process-wide httpx client, keeping connections alive per host."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = httpx.Client(
+                http2=HTTP2_AVAILABLE,
+                headers=HEADERS,
+                timeout=TIMEOUT,
+                limits=LIMITS,
+                follow_redirects=True,
+                event_hooks={'request': [_start_timer], 'response': [_record_response]},
+            )
+        return _client
+
+def get(url, attempts=None, **kwargs):
+    """GET a URL through the shared client, rate limited and retried by the per-host request policy."""
+    return request_policy.send(lambda: get_client().get(url, **kwargs), url, attempts)
+
+def head(url, attempts=None, **kwargs):
+    """HEAD a URL through the shared client and request policy; redirects are followed."""
+    return request_policy.send(lambda: get_client().head(url, **kwargs), url, attempts)
+
+def get_headers(url, attempts=None, **kwargs):
+    """GET a URL but close the response once its headers arrived; the body is never downloaded."""
+    def send_request():
+        client = get_client()
+        response = client.send(client.build_request('GET', url, **kwargs), stream=True)
+        response.close()
+        return response
+    return request_policy.send(send_request, url, attempts)
+
+def close_client():
+    """Close the shared client and its pooled connections."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+atexit.register(close_client)
@@ -1,14 +1,15 @@
-import requests
-from bs4 import BeautifulSoup
-import json
-import os
+import httpx
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
 
-# Adjust the paths relative to the script's current location
-BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
-DATA_DIR = os.path.join(BASE_DIR, 'ani-tool', 'data')
+import config
+import http_cache
+import html_parser
+import library
+import selection as content_selection
 
-# Ensure the 'data' directory exists
-os.makedirs(DATA_DIR, exist_ok=True)
+MAX_CONCURRENT_PAGES = 6  # /filme and /staffel-N pages fetched at the same time
 
 def extract_anime_name(soup, debug=False):
     """Extract the anime name from the page content."""
@@ -28,194 +29,250 @@ def extract_anime_name(soup, debug=False):
             print(f"Error extracting anime name: {e}")
     return anime_name
 
-def check_filme_section(base_url, debug=False):
-    """Check if the /filme section exists and fetch its movies."""
-    filme_url = base_url + '/filme'
-    try:
-        response = requests.get(filme_url)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        movies = soup.find_all('tr', {'itemprop': 'episode'})
-        movie_info_list = []
-        if movies:
-            if debug:
-                print(f"/filme section exists and contains {len(movies)} movies.")
-
-            for index, movie in enumerate(movies, 1):
-                title_div = movie.find('td', class_='seasonEpisodeTitle')
-                movie_title = title_div.get_text(strip=True).split(' - ')[0] if title_div else "Unknown"
-                movie_url = f"{base_url}/filme/film-{index}"
-
-                streaming_services = []
-                service_icons = movie.find_all('i', class_='icon')
-                for icon in service_icons:
-                    service = icon.get('title', 'Unknown')
-                    streaming_services.append(service.lower())
-                streaming_services = ','.join(streaming_services) if streaming_services else "None"
-
-                languages = set()
-                language_flags = movie.find_all('img', class_='flag')
-                for flag in language_flags:
-                    title = flag.get('title', 'Unknown').lower()
-                    if 'deutsch' in title and 'untertitel' not in title:
-                        languages.add('ger')
-                    elif 'mit deutschem untertitel' in title:
-                        languages.add('gersub')
-                    elif 'englisch' in title or 'english' in title:
-                        languages.add('engsub')
-                languages = ','.join(sorted(languages)) if languages else "None"
-
-                movie_info_list.append({
-                    'movie_number': index,
-                    'movie_name': movie_title,
-                    'movie_url': movie_url,
-                    'services': streaming_services,
-                    'languages': languages
-                })
-
-            return movie_info_list
-        else:
-            if debug:
-                print(f"/filme section exists but contains no movies.")
-            return []
-
-    except requests.RequestException:
+def parse_movie_list(movies_html, base_url, debug=False):
+    """Parse the movie rows of a /filme page into the movie list."""
+    soup = html_parser.make_soup(movies_html, html_parser.MOVIE_ROWS)
+
+    movies = soup.find_all('tr', {'itemprop': 'episode'})
+    movie_info_list = []
+    if movies:
         if debug:
-            print(f"/filme section not found or inaccessible.")
+            print(f"/filme section exists and contains {len(movies)} movies.")
+
+        for index, movie in enumerate(movies, 1):
+            title_div = movie.find('td', class_='seasonEpisodeTitle')
+            movie_title = title_div.get_text(strip=True).split(' - ')[0] if title_div else "Unknown"
+            movie_url = f"{base_url}/filme/film-{index}"
+
+            streaming_services = []
+            service_icons = movie.find_all('i', class_='icon')
+            for icon in service_icons:
+                service = icon.get('title', 'Unknown')
+                streaming_services.append(service.lower())
+            streaming_services = ','.join(streaming_services) if streaming_services else "None"
+
+            languages = set()
+            language_flags = movie.find_all('img', class_='flag')
+            for flag in language_flags:
+                title = flag.get('title', 'Unknown').lower()
+                if 'deutsch' in title and 'untertitel' not in title:
+                    languages.add('ger')
+                elif 'mit deutschem untertitel' in title:
+                    languages.add('gersub')
+                elif 'englisch' in title or 'english' in title:
+                    languages.add('engsub')
+            languages = ','.join(sorted(languages)) if languages else "None"
+
+            movie_info_list.append({
+                'movie_number': index,
+                'movie_name': movie_title,
+                'movie_url': movie_url,
+                'services': streaming_services,
+                'languages': languages
+            })
+
+        return movie_info_list
+    else:
+        if debug:
+            print(f"/filme section exists but contains no movies.")
         return []
 
-def fetch_total_seasons(base_url, debug=False):
-    """Fetch the total number of seasons based on the page meta information."""
-    try:
-        response = requests.get(base_url)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        meta_tag = soup.find('meta', {'itemprop': 'numberOfSeasons'})
-        if meta_tag:
-            total_seasons = int(meta_tag['content'])
-            if debug:
-                print(f"Total seasons according to meta: {total_seasons}")
-            return total_seasons
-        else:
-            if debug:
-                print("No 'numberOfSeasons' meta tag found.")
-            return 0
-    except requests.RequestException as e:
+def parse_season_page(season_html, base_url, season_number, debug=False):
+    """Parse the episode table of a /staffel-N page into the season dict (None if there is no table)."""
+    season_soup = html_parser.make_soup(season_html, html_parser.season_table(season_number))
+    season_container = season_soup.find('tbody', id=f'season{season_number}')
+
+    if not season_container:
         if debug:
-            print(f"Error fetching season count: {e}")
-        return 0
+            print(f"Seasons container not found for Season {season_number}.")
+        return None
+
+    episodes = season_container.find_all('tr', {'itemprop': 'episode'})
+    season_data = {
+        'total_episodes': len(episodes),
+        'episodes': {}
+    }
+
+    for episode in episodes:
+        episode_number = episode.find('meta', {'itemprop': 'episodeNumber'})['content']
+        title_div = episode.find('td', class_='seasonEpisodeTitle')
+        episode_title = title_div.get_text(strip=True).split(' - ')[0] if title_div else "Unknown"
+        episode_url = f"{base_url}/staffel-{season_number}/episode-{episode_number}"
+
+        streaming_services = []
+        service_icons = episode.find_all('i', class_='icon')
+        for icon in service_icons:
+            service = icon.get('title', 'Unknown')
+            streaming_services.append(service.lower())
+        streaming_services = ','.join(streaming_services) if streaming_services else "None"
+
+        languages = set()
+        language_flags = episode.find_all('img', class_='flag')
+        for flag in language_flags:
+            title = flag.get('title', 'Unknown').lower()
+            if 'deutsch' in title and 'untertitel' not in title:
+                languages.add('ger')
+            elif 'mit deutschem untertitel' in title:
+                languages.add('gersub')
+            elif 'englisch' in title or 'english' in title:
+                languages.add('engsub')
+        languages = ','.join(sorted(languages)) if languages else "None"
+
+        season_data['episodes'][f"E{episode_number}"] = {
+            'episode_title': episode_title,
+            'episode_url': episode_url,
+            'services': streaming_services,
+            'languages': languages
+        }
 
-def fetch_anime_episodes(base_url, debug=False):
-    """Fetch anime episodes and movies and organize them into a structured JSON format."""
-    try:
-        if not base_url.startswith('http'):
-            base_url = 'https://aniworld.to' + base_url
-        
+    return season_data
+
+def parse_total_seasons(soup, debug=False):
+    """Read the number of seasons (movies count as one) from the series page meta information."""
+    meta_tag = soup.find('meta', {'itemprop': 'numberOfSeasons'})
+    if meta_tag:
+        total_seasons = int(meta_tag['content'])
+        if debug:
+            print(f"Total seasons according to meta: {total_seasons}")
+        return total_seasons
+    else:
         if debug:
-            print(f"Fetching base URL: {base_url}")
+            print("No 'numberOfSeasons' meta tag found.")
+        return 0
 
-        response = requests.get(base_url)
+def plan_crawl(base_url, series_html, debug=False):
+    """Parse the series page once and plan which /filme and /staffel-N pages to fetch.
+
+    numberOfSeasons counts the movies as a season. If the page links to /filme we know
+    the last /staffel-N does not exist; otherwise it is fetched speculatively alongside
+    /filme and dropped again if movies turn up.
+    """
+    soup = html_parser.make_soup(series_html)
+    total_seasons = parse_total_seasons(soup, debug)
+    has_movie_link = soup.find('a', href=re.compile(r'/filme/?$')) is not None
+    season_count = total_seasons - 1 if has_movie_link else total_seasons
+    return {
+        'anime_name': extract_anime_name(soup, debug),
+        'total_seasons': total_seasons,
+        'season_urls': {number: f"{base_url}/staffel-{number}" for number in range(1, max(season_count, 0) + 1)},
+        'filme_url': f"{base_url}/filme",
+    }
+
+def fetch_page(url, debug=False):
+    """Fetch one catalog page, returning its HTML or None on any HTTP error."""
+    try:
+        response = http_cache.get(url)
         response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        # Extract the anime name
-        anime_name = extract_anime_name(soup, debug)
-
-        anime_data = {
-            'anime_name': anime_name,
-            'total_seasons': 0,
-            'total_episodes': 0,
-            'movies': {
-                'total_movies': 0,
-                'movie_list': []
-            },
-            'seasons': {}
+        return response.text
+    except httpx.HTTPError as e:
+        if debug:
+            print(f"Could not fetch {url}: {e}")
+        return None
+
+def fetch_pages(urls, max_workers=MAX_CONCURRENT_PAGES, debug=False):
+    """Fetch pages concurrently (at most max_workers at a time) and return {url: html or None}."""
+    if not urls:
+        return {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(urls, executor.map(lambda url: fetch_page(url, debug), urls)))
+
+def collect_anime_data(base_url, debug=False, max_workers=MAX_CONCURRENT_PAGES, selection=None):
+    """Fetch anime episodes and movies and return them as a structured dict (None on failure).
+
+    With a selection (see selection.py) only the wanted /staffel-N and /filme pages are
+    fetched and only the wanted episodes end up in the dict, so later stages skip the rest.
+    """
+    selection = selection or content_selection.Selection()
+    if not base_url.startswith('http'):
+        base_url = config.BASE_URL + base_url
+
+    if debug:
+        print(f"Fetching base URL: {base_url}")
+
+    series_html = fetch_page(base_url, debug)
+    if series_html is None:
+        print(f"Error fetching anime details: {base_url}")
+        return None
+
+    # The series page is parsed once for both the name and the season count
+    plan = plan_crawl(base_url, series_html, debug)
+    if plan['total_seasons'] == 0:
+        print("No seasons information available.")
+        return None
+
+    anime_data = {
+        'anime_name': plan['anime_name'],
+        'total_seasons': 0,
+        'total_episodes': 0,
+        'movies': {
+            'total_movies': 0,
+            'movie_list': []
+        },
+        'seasons': {}
+    }
+
+    # /filme and every wanted /staffel-N page are fetched at the same time
+    season_urls = {number: url for number, url in plan['season_urls'].items() if selection.wants_season(number)}
+    page_urls = ([plan['filme_url']] if selection.movies else []) + list(season_urls.values())
+    pages = fetch_pages(page_urls, max_workers, debug)
+
+    movies_html = pages.get(plan['filme_url'])
+    all_movies = parse_movie_list(movies_html, base_url, debug) if movies_html else []
+    movie_info_list = [
+        movie for movie in all_movies
+        if selection.wants_movie(movie['movie_number']) and selection.wants_flags(movie['languages'])
+    ]
+    total_seasons = plan['total_seasons']
+    # numberOfSeasons counts the movies as a season (also when /filme was linked but not fetched)
+    if all_movies or (not selection.movies and len(plan['season_urls']) < total_seasons):
+        total_seasons -= 1
+    if movie_info_list:
+        anime_data['movies']['total_movies'] = len(movie_info_list)
+        anime_data['movies']['movie_list'] = movie_info_list
+
+    if total_seasons == 0:
+        print("No valid seasons found.")
+        return anime_data
+
+    anime_data['total_seasons'] = total_seasons
+    total_episode_count = 0
+    for season_number in range(1, total_seasons + 1):
+        season_url = season_urls.get(season_number)
+        season_html = pages.get(season_url)
+        if debug:
+            print(f"Processing Season {season_number} - {season_url}")
+        if season_html is None:
+            continue
+
+        season_data = parse_season_page(season_html, base_url, season_number, debug)
+        if season_data is None:
+            continue
+        season_data['episodes'] = {
+            episode_id: episode_data for episode_id, episode_data in season_data['episodes'].items()
+            if selection.wants_episode(season_number, int(episode_id[1:])) and selection.wants_flags(episode_data['languages'])
         }
-
-        total_seasons = fetch_total_seasons(base_url, debug)
-        if total_seasons == 0:
-            print("No seasons information available.")
-            return
-
-        movie_info_list = check_filme_section(base_url, debug)
-        if movie_info_list:
-            anime_data['movies']['total_movies'] = len(movie_info_list)
-            anime_data['movies']['movie_list'] = movie_info_list
-            total_seasons -= 1
-
-        if total_seasons == 0:
-            print("No valid seasons found.")
-        else:
-            anime_data['total_seasons'] = total_seasons
-            total_episode_count = 0
-            for season_number in range(1, total_seasons + 1):
-                season_url = f"{base_url}/staffel-{season_number}"
-                if debug:
-                    print(f"Processing Season {season_number} - {season_url}")
-
-                season_response = requests.get(season_url)
-                season_soup = BeautifulSoup(season_response.text, 'html.parser')
-                season_container = season_soup.find('tbody', id=f'season{season_number}')
-
-                if not season_container:
-                    if debug:
-                        print(f"Seasons container not found for Season {season_number}.")
-                    continue
-
-                episodes = season_container.find_all('tr', {'itemprop': 'episode'})
-                season_data = {
-                    'total_episodes': len(episodes),
-                    'episodes': {}
-                }
-                total_episode_count += len(episodes)
-
-                for episode in episodes:
-                    episode_number = episode.find('meta', {'itemprop': 'episodeNumber'})['content']
-                    title_div = episode.find('td', class_='seasonEpisodeTitle')
-                    episode_title = title_div.get_text(strip=True).split(' - ')[0] if title_div else "Unknown"
-                    episode_url = f"{base_url}/staffel-{season_number}/episode-{episode_number}"
-
-                    streaming_services = []
-                    service_icons = episode.find_all('i', class_='icon')
-                    for icon in service_icons:
-                        service = icon.get('title', 'Unknown')
-                        streaming_services.append(service.lower())
-                    streaming_services = ','.join(streaming_services) if streaming_services else "None"
-
-                    languages = set()
-                    language_flags = episode.find_all('img', class_='flag')
-                    for flag in language_flags:
-                        title = flag.get('title', 'Unknown').lower()
-                        if 'deutsch' in title and 'untertitel' not in title:
-                            languages.add('ger')
-                        elif 'mit deutschem untertitel' in title:
-                            languages.add('gersub')
-                        elif 'englisch' in title or 'english' in title:
-                            languages.add('engsub')
-                    languages = ','.join(sorted(languages)) if languages else "None"
-
-                    season_data['episodes'][f"E{episode_number}"] = {
-                        'episode_title': episode_title,
-                        'episode_url': episode_url,
-                        'services': streaming_services,
-                        'languages': languages
-                    }
-
-                anime_data['seasons'][f"Season {season_number}"] = season_data
-
-            anime_data['total_episodes'] = total_episode_count
-
-    except requests.RequestException as e:
-        print(f"Error fetching anime details: {e}")
-
-    # Save the structured data as a JSON file in the 'data' directory
-    file_path = os.path.join(DATA_DIR, "data.json")
-    with open(file_path, 'w', encoding='utf-8') as json_file:
-        json.dump(anime_data, json_file, ensure_ascii=False, indent=4)
-        print(f"Anime data saved to {file_path}")
-
-# Example usage
-url = '/anime/stream/death-note'
-fetch_anime_episodes(url, debug=True)
+        season_data['total_episodes'] = len(season_data['episodes'])
+        if not season_data['episodes']:
+            continue
+        total_episode_count += season_data['total_episodes']
+
+        anime_data['seasons'][f"Season {season_number}"] = season_data
+
+    anime_data['total_episodes'] = total_episode_count
+    return anime_data
+
+def fetch_anime_episodes(base_url, debug=False, selection=None):
+    """Fetch anime episodes and movies and save them into the library (see library.py)."""
+    anime_data = collect_anime_data(base_url, debug, selection=selection)
+    if anime_data is not None:
+        store = library.Library()
+        store.save_anime(base_url, anime_data)
+        store.close()
+        print(f"Anime data saved to {library.DB_PATH}")
+    return anime_data
+
+if __name__ == "__main__":
+    # Example usage: python info_getter.py /anime/stream/death-note ["S1E1-S1E5, german only"]
+    url = sys.argv[1] if len(sys.argv) > 1 else '/anime/stream/death-note'
+    spec = sys.argv[2] if len(sys.argv) > 2 else ''
+    fetch_anime_episodes(url, debug=True, selection=content_selection.parse_selection(spec))
@@ -0,0 +1,250 @@
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+import config
+import metrics
+import pipeline
+import selection as content_selection
+
+# Paths
+QUEUE_DIR = os.path.join(config.DATA_DIR, 'jobs')
+DB_PATH = os.path.join(QUEUE_DIR, 'jobs.sqlite3')
+
+# Global limits, shared by every job the scheduler runs at the same time
+MAX_JOBS = 3          # Series/seasons/episodes worked on at once
+SCRAPE_LIMIT = 8      # Concurrent aniworld page fetches
+RESOLVE_LIMIT = 4     # Concurrent VOE resolutions
+DOWNLOAD_LIMIT = 4    # Concurrent stream downloads
+MAX_ATTEMPTS = 3      # Runs of a job before it stays failed
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    anime_url TEXT NOT NULL,
+    anime_name TEXT,
+    selection TEXT,            -- Selection spec, e.g. 'S2E5-S2E12, german_sub only' (NULL: everything)
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'queued',  -- queued, running, done, failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (status, priority DESC, id);
+"""
+
+class FairLimiter:
+    """Caps concurrent work globally and hands free slots to the waiting jobs in turn.
+
+    A job with many waiting tasks cannot starve the others: after each grant its
+    owner goes to the back of the line.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_use = 0
+        self.cond = threading.Condition()
+        self.waiting = {}      # owner -> number of waiting tasks
+        self.turns = deque()   # owners with waiting tasks, next in line first
+
+    def acquire(self, owner):
+        with self.cond:
+            if owner not in self.waiting:
+                self.turns.append(owner)
+            self.waiting[owner] = self.waiting.get(owner, 0) + 1
+            while self.in_use >= self.limit or self.turns[0] != owner:
+                self.cond.wait()
+            self.in_use += 1
+            self.turns.popleft()
+            self.waiting[owner] -= 1
+            if self.waiting[owner]:
+                self.turns.append(owner)
+            else:
+                del self.waiting[owner]
+            self.cond.notify_all()
+
+    def release(self):
+        with self.cond:
+            self.in_use -= 1
+            self.cond.notify_all()
+
+    @contextmanager
+    def slot(self, owner):
+        self.acquire(owner)
+        try:
+            yield
+        finally:
+            self.release()
+
+def connect(db_path=DB_PATH):
+    """Open the queue database, creating it on first use."""
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    connection = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+    connection.row_factory = sqlite3.Row
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.executescript(SCHEMA)
+    return connection
+
+def enqueue(connection, anime_url, anime_name=None, selection=None, priority=0):
+    """Add a series, or the part of it a selection spec picks, to the queue; returns the job id."""
+    content_selection.parse_selection(selection)  # Reject invalid specs now, not when the job runs
+    now = time.time()
+    cursor = connection.execute(
+        'INSERT INTO jobs (anime_url, anime_name, selection, priority, created_at, updated_at) '
+        'VALUES (?, ?, ?, ?, ?, ?)',
+        (anime_url, anime_name, selection or None, priority, now, now),
+    )
+    return cursor.lastrowid
+
+def list_jobs(connection, status=None):
+    """Return the jobs (optionally only those with the given status), highest priority first."""
+    query = 'SELECT * FROM jobs'
+    params = ()
+    if status:
+        query += ' WHERE status = ?'
+        params = (status,)
+    return connection.execute(query + ' ORDER BY priority DESC, id', params).fetchall()
+
+def recover(connection):
+    """Put jobs that were running when the process died back in the queue; returns how many."""
+    cursor = connection.execute(
+        "UPDATE jobs SET status = 'queued', updated_at = ? WHERE status = 'running'", (time.time(),))
+    return cursor.rowcount
+
+def claim_next(connection):
+    """Atomically mark the next queued job as running and return it, or None if the queue is empty."""
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        job = connection.execute(
+            "SELECT * FROM jobs WHERE status = 'queued' ORDER BY priority DESC, id LIMIT 1").fetchone()
+        if job is not None:
+            connection.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (time.time(), job['id']))
+        connection.execute('COMMIT')
+    except sqlite3.Error:
+        connection.execute('ROLLBACK')
+        raise
+    return job
+
+def finish(connection, job, error=None, max_attempts=MAX_ATTEMPTS):
+    """Mark a job done, or requeue it after a failure until it ran out of attempts."""
+    # job is the row returned by claim_next(), read before its attempt counter was increased
+    if error is None:
+        status = 'done'
+    else:
+        status = 'queued' if job['attempts'] + 1 < max_attempts else 'failed'
+    connection.execute(
+        'UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?',
+        (status, error, time.time(), job['id']))
+    return status
+
+def describe(job):
+    """Human readable scope of a job, e.g. 'death-note [S1E5-S1E8]'."""
+    name = job['anime_name'] or job['anime_url'].rstrip('/').rsplit('/', 1)[-1]
+    if not job['selection']:
+        return name
+    return f"{name} [{job['selection']}]"
+
+def run_job(job, limits, retries=3, debug=False):
+    """Scrape, resolve and download the scope of one job under the shared limits; returns an error or None."""
+    owner = job['id']
+    selection = content_selection.parse_selection(job['selection'])
+    with limits['scrape'].slot(owner):
+        anime_data = pipeline.gather_anime_info(job['anime_url'], debug, selection)
+    if anime_data is None:
+        return 'could not gather anime info'
+    if anime_data['movies']['total_movies'] + anime_data['total_episodes'] == 0:
+        return 'nothing matches the selection'
+
+    result = pipeline.stream_anime_data(anime_data, retries=retries, debug=debug, limits=limits, owner=owner,
+                                        selection=selection, anime_url=job['anime_url'])
+    if result['failed']:
+        return f"{len(result['failed'])} downloads failed"
+    return None
+
+def run_queue(max_jobs=MAX_JOBS, scrape_limit=SCRAPE_LIMIT, resolve_limit=RESOLVE_LIMIT,
+              download_limit=DOWNLOAD_LIMIT, retries=3, debug=False, db_path=DB_PATH):
+    """Work through the queue with max_jobs jobs at once until it is empty."""
+    metrics.reset()
+    connection = connect(db_path)
+    recovered = recover(connection)
+    if recovered:
+        print(f"Requeued {recovered} jobs interrupted by the last run.")
+
+    limits = {
+        'scrape': FairLimiter(scrape_limit),
+        'resolve': FairLimiter(resolve_limit),
+        'download': FairLimiter(download_limit),
+    }
+    db_lock = threading.Lock()  # One connection, used by every worker thread in turn
+
+    def worker():
+        while True:
+            with db_lock:
+                job = claim_next(connection)
+            if job is None:
+                return
+            print(f"Starting job {job['id']}: {describe(job)} (priority {job['priority']})")
+            try:
+                error = run_job(job, limits, retries, debug)
+            except Exception as e:
+                error = str(e) or type(e).__name__
+            with db_lock:
+                status = finish(connection, job, error)
+            print(f"Job {job['id']} {describe(job)}: {status}" + (f" ({error})" if error else ""))
+
+    workers = [threading.Thread(target=worker, daemon=True) for _ in range(max_jobs)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    connection.close()
+    metrics.export('queue')
+
+def print_jobs(db_path=DB_PATH):
+    """Print the queue."""
+    connection = connect(db_path)
+    jobs = list_jobs(connection)
+    connection.close()
+    if not jobs:
+        print("The queue is empty.")
+    for job in jobs:
+        print(f"[{job['id']}] {describe(job):40} priority {job['priority']:3}  {job['status']:8} "
+              f"attempts {job['attempts']}" + (f"  {job['error']}" if job['error'] else ""))
+
+if __name__ == "__main__":
+    # Example usage:
+    #   python job_queue.py add /anime/stream/one-piece --select "S2E5-S2E12, german_sub only" --priority 5
+    #   python job_queue.py run
+    #   python job_queue.py list
+    parser = argparse.ArgumentParser(description='Persistent download queue')
+    commands = parser.add_subparsers(dest='command', required=True)
+    add = commands.add_parser('add', help='queue a series or part of it')
+    add.add_argument('anime_url')
+    add.add_argument('--select', default='', help='e.g. "S2E5-S2E12, german_sub only, skip movies"')
+    add.add_argument('--priority', type=int, default=0, help='higher runs first')
+    run = commands.add_parser('run', help='work through the queue')
+    run.add_argument('--jobs', type=int, default=MAX_JOBS)
+    run.add_argument('--debug', action='store_true')
+    commands.add_parser('list', help='show the queue')
+    args = parser.parse_args()
+
+    if args.command == 'add':
+        connection = connect()
+        try:
+            job_id = enqueue(connection, args.anime_url, selection=args.select, priority=args.priority)
+        except ValueError as e:
+            sys.exit(f"Invalid selection: {e}")
+        connection.close()
+        print(f"Queued job {job_id}.")
+    elif args.command == 'run':
+        run_queue(max_jobs=args.jobs, debug=args.debug)
+    else:
+        print_jobs()
@@ -0,0 +1,297 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import threading
+
+import config
+import selection as content_selection
+
+# Paths
+LIBRARY_DIR = os.path.join(config.DATA_DIR, 'library')
+DB_PATH = os.path.join(LIBRARY_DIR, 'library.sqlite3')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS anime (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL UNIQUE,            -- Full series URL
+    name TEXT NOT NULL,
+    total_seasons INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    extracted_at REAL,                   -- Set when every episode's hoster links were extracted
+    resolved_at REAL                     -- Set when every extracted stream was resolved
+);
+CREATE TABLE IF NOT EXISTS season (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    anime_id INTEGER NOT NULL REFERENCES anime (id) ON DELETE CASCADE,
+    number INTEGER NOT NULL,             -- 0: movies
+    UNIQUE (anime_id, number)
+);
+CREATE TABLE IF NOT EXISTS episode (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    season_id INTEGER NOT NULL REFERENCES season (id) ON DELETE CASCADE,
+    number INTEGER NOT NULL,             -- Episode or movie number
+    title TEXT NOT NULL,
+    url TEXT NOT NULL,
+    flags TEXT,                          -- Language codes of the season page, e.g. 'ger,gersub'
+    UNIQUE (season_id, number)
+);
+CREATE TABLE IF NOT EXISTS stream (
+    episode_id INTEGER NOT NULL REFERENCES episode (id) ON DELETE CASCADE,
+    language TEXT NOT NULL,              -- Extracted language name, e.g. 'mit-untertitel-deutsch'
+    links TEXT NOT NULL,                 -- JSON list of {service_name, stream_url} from the episode page
+    m3u8_url TEXT,                       -- NULL until resolved
+    resolved_at REAL,
+    PRIMARY KEY (episode_id, language)
+);
+CREATE INDEX IF NOT EXISTS stream_unresolved ON stream (episode_id) WHERE m3u8_url IS NULL;
+CREATE TABLE IF NOT EXISTS download (
+    episode_id INTEGER NOT NULL REFERENCES episode (id) ON DELETE CASCADE,
+    language TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    duration REAL,
+    source_url TEXT,
+    completed_at REAL NOT NULL,
+    PRIMARY KEY (episode_id, language)
+);
+"""
+
+# Episode rows with their series and season, ordered like the S/E order of the extractor
+EPISODE_QUERY = """
+SELECT episode.id, episode.number, episode.title, episode.url, episode.flags,
+       season.number AS season, anime.id AS anime_id, anime.name AS anime_name
+FROM episode
+JOIN season ON season.id = episode.season_id
+JOIN anime ON anime.id = season.anime_id
+"""
+
+def full_url(anime_url):
+    """Series URL as stored in the library ('/anime/stream/x' -> 'https://aniworld.to/anime/stream/x')."""
+    if not anime_url.startswith('http'):
+        anime_url = config.BASE_URL + anime_url
+    return anime_url.rstrip('/')
+
+def content_title(season, number, title):
+    """Title the stages use for an episode, e.g. 'S1E5 - Title' ('S0E1 - Name' for movies)."""
+    return f"S{season}E{number} - {title}"
+
+class Library:
+    """Indexed store of every crawled series: seasons, episodes, resolved streams and finished downloads.
+
+    One connection per Library, shared by the threads of a run. The database runs in WAL
+    mode, so the stage scripts can read and write it from separate processes at once.
+    """
+
+    def __init__(self, db_path=DB_PATH):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA foreign_keys=ON')
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def _query(self, sql, params=()):
+        with self.lock:
+            return self.connection.execute(sql, params).fetchall()
+
+    def save_anime(self, anime_url, anime_data):
+        """Insert or update a series and the movies and episodes in an anime data dict; returns the anime id.
+
+        Episodes missing from anime_data (e.g. left out by a selection) are kept. A new crawl
+        resets the stage markers, since there may be new episodes to extract.
+        """
+        now = time.time()
+        with self.lock:
+            connection = self.connection
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                connection.execute(
+                    'INSERT INTO anime (url, name, total_seasons, updated_at) VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT (url) DO UPDATE SET name = excluded.name, '
+                    'total_seasons = MAX(total_seasons, excluded.total_seasons), updated_at = excluded.updated_at, '
+                    'extracted_at = NULL, resolved_at = NULL',
+                    (full_url(anime_url), anime_data['anime_name'], anime_data.get('total_seasons', 0), now))
+                anime_id = connection.execute('SELECT id FROM anime WHERE url = ?', (full_url(anime_url),)).fetchone()[0]
+
+                episodes = [
+                    (0, movie['movie_number'], movie['movie_name'], movie['movie_url'], movie.get('languages'))
+                    for movie in anime_data.get('movies', {}).get('movie_list', [])
+                ]
+                for season_name, season_data in anime_data.get('seasons', {}).items():
+                    season_number = int(season_name.split(' ')[1])
+                    episodes.extend(
+                        (season_number, int(episode_id[1:]), episode_data['episode_title'],
+                         episode_data['episode_url'], episode_data.get('languages'))
+                        for episode_id, episode_data in season_data.get('episodes', {}).items()
+                    )
+
+                season_ids = {}
+                for season_number, number, title, url, flags in episodes:
+                    if season_number not in season_ids:
+                        connection.execute('INSERT OR IGNORE INTO season (anime_id, number) VALUES (?, ?)',
+                                           (anime_id, season_number))
+                        season_ids[season_number] = connection.execute(
+                            'SELECT id FROM season WHERE anime_id = ? AND number = ?',
+                            (anime_id, season_number)).fetchone()[0]
+                    connection.execute(
+                        'INSERT INTO episode (season_id, number, title, url, flags) VALUES (?, ?, ?, ?, ?) '
+                        'ON CONFLICT (season_id, number) DO UPDATE SET title = excluded.title, url = excluded.url, '
+                        'flags = excluded.flags',
+                        (season_ids[season_number], number, title, url, flags))
+                connection.execute('COMMIT')
+            except sqlite3.Error:
+                connection.execute('ROLLBACK')
+                raise
+        return anime_id
+
+    def anime(self, anime_url):
+        """The anime row of a series URL, or None if it was never crawled."""
+        rows = self._query('SELECT * FROM anime WHERE url = ?', (full_url(anime_url),))
+        return rows[0] if rows else None
+
+    def episodes(self, anime_id):
+        """Map the content title of every stored movie and episode of a series to its row, in S/E order."""
+        rows = self._query(EPISODE_QUERY + ' WHERE anime.id = ? ORDER BY season.number, episode.number', (anime_id,))
+        return {content_title(row['season'], row['number'], row['title']): row for row in rows}
+
+    def anime_data(self, anime_id):
+        """Rebuild the anime data dict of info_getter from the stored rows."""
+        anime = self._query('SELECT * FROM anime WHERE id = ?', (anime_id,))[0]
+        anime_data = {
+            'anime_name': anime['name'],
+            'total_seasons': anime['total_seasons'],
+            'total_episodes': 0,
+            'movies': {'total_movies': 0, 'movie_list': []},
+            'seasons': {},
+        }
+        for row in self.episodes(anime_id).values():
+            if row['season'] == 0:
+                anime_data['movies']['movie_list'].append({
+                    'movie_number': row['number'], 'movie_name': row['title'],
+                    'movie_url': row['url'], 'languages': row['flags'],
+                })
+                anime_data['movies']['total_movies'] += 1
+                continue
+            season_data = anime_data['seasons'].setdefault(f"Season {row['season']}", {'total_episodes': 0, 'episodes': {}})
+            season_data['episodes'][f"E{row['number']}"] = {
+                'episode_title': row['title'], 'episode_url': row['url'], 'languages': row['flags'],
+            }
+            season_data['total_episodes'] += 1
+            anime_data['total_episodes'] += 1
+        return anime_data
+
+    def save_links(self, episode_id, links):
+        """Store the hoster links per language extracted from an episode page; resolved URLs are kept."""
+        with self.lock:
+            for language, services in links.items():
+                self.connection.execute(
+                    'INSERT INTO stream (episode_id, language, links) VALUES (?, ?, ?) '
+                    'ON CONFLICT (episode_id, language) DO UPDATE SET links = excluded.links',
+                    (episode_id, language, json.dumps(services, ensure_ascii=False)))
+
+    def save_m3u8(self, episode_id, m3u8_links):
+        """Store the m3u8 URL resolved for each language of an episode."""
+        now = time.time()
+        with self.lock:
+            for language, m3u8_url in m3u8_links.items():
+                self.connection.execute(
+                    'UPDATE stream SET m3u8_url = ?, resolved_at = ? WHERE episode_id = ? AND language = ?',
+                    (m3u8_url, now, episode_id, language))
+
+    def unextracted(self, anime_id):
+        """Episode rows of a series whose page was not extracted yet, in S/E order."""
+        rows = self._query(
+            EPISODE_QUERY + ' WHERE anime.id = ? AND NOT EXISTS (SELECT 1 FROM stream WHERE stream.episode_id = episode.id) '
+            'ORDER BY season.number, episode.number', (anime_id,))
+        return rows
+
+    def unresolved(self, anime_id):
+        """(episode row, {language: services}) for every episode with streams that still need resolving."""
+        rows = self._query(
+            'SELECT stream.episode_id, stream.language, stream.links FROM stream '
+            'JOIN episode ON episode.id = stream.episode_id JOIN season ON season.id = episode.season_id '
+            'WHERE season.anime_id = ? AND stream.m3u8_url IS NULL ORDER BY season.number, episode.number',
+            (anime_id,))
+        return self._group(anime_id, rows, 'links', json.loads)
+
+    def undownloaded(self, anime_id):
+        """(episode row, {language: m3u8_url}) for every resolved stream without a recorded download."""
+        rows = self._query(
+            'SELECT stream.episode_id, stream.language, stream.m3u8_url FROM stream '
+            'JOIN episode ON episode.id = stream.episode_id JOIN season ON season.id = episode.season_id '
+            'WHERE season.anime_id = ? AND stream.m3u8_url IS NOT NULL AND NOT EXISTS ('
+            'SELECT 1 FROM download WHERE download.episode_id = stream.episode_id AND download.language = stream.language) '
+            'ORDER BY season.number, episode.number', (anime_id,))
+        return self._group(anime_id, rows, 'm3u8_url')
+
+    def _group(self, anime_id, rows, column, convert=lambda value: value):
+        episodes = {row['id']: row for row in self.episodes(anime_id).values()}
+        grouped = {}
+        for row in rows:
+            grouped.setdefault(row['episode_id'], {})[row['language']] = convert(row[column])
+        return [(episodes[episode_id], languages) for episode_id, languages in grouped.items()]
+
+    def record_download(self, episode_id, language, path, source_url=None, duration=None):
+        """Record a finished download of one language of an episode."""
+        with self.lock:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO download (episode_id, language, path, size, duration, source_url, completed_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (episode_id, language, path, os.path.getsize(path), duration, source_url, time.time()))
+
+    def forget_download(self, path):
+        """Drop the download record of a file, e.g. after it turned out to be broken."""
+        with self.lock:
+            self.connection.execute('DELETE FROM download WHERE path = ?', (path,))
+
+    def mark_done(self, anime_id, stage):
+        """Mark the 'extracted' or 'resolved' stage of a series as finished."""
+        column = {'extracted': 'extracted_at', 'resolved': 'resolved_at'}[stage]
+        with self.lock:
+            self.connection.execute(f'UPDATE anime SET {column} = ? WHERE id = ?', (time.time(), anime_id))
+
+    def is_done(self, anime_id, stage):
+        column = {'extracted': 'extracted_at', 'resolved': 'resolved_at'}[stage]
+        return self._query(f'SELECT {column} FROM anime WHERE id = ?', (anime_id,))[0][0] is not None
+
+    def missing_downloads(self, folder, anime_url=None):
+        """Episode rows offering a language (download folder, e.g. 'german_sub') that was not downloaded yet.
+
+        An episode offers a language if a stream in it was extracted or the season page flags it.
+        Covers the whole library, or one series with anime_url.
+        """
+        languages = [name for name, language_folder in content_selection.LANGUAGE_FOLDERS.items() if language_folder == folder]
+        if not languages:
+            raise ValueError(f"Unknown language folder: {folder!r}")
+        placeholders = ', '.join('?' * len(languages))
+        sql = (
+            EPISODE_QUERY + f' WHERE NOT EXISTS (SELECT 1 FROM download WHERE download.episode_id = episode.id '
+            f'AND download.language IN ({placeholders})) AND (EXISTS (SELECT 1 FROM stream WHERE '
+            f"stream.episode_id = episode.id AND stream.language IN ({placeholders})) OR ',' || episode.flags || ',' LIKE ?)"
+        )
+        params = languages + languages + [f"%,{content_selection.FLAG_CODES[folder]},%"]
+        if anime_url:
+            sql += ' AND anime.url = ?'
+            params.append(full_url(anime_url))
+        return self._query(sql + ' ORDER BY anime.name, season.number, episode.number', params)
+
+if __name__ == "__main__":
+    # Example usage: python library.py missing german_sub [/anime/stream/one-piece]
+    if len(sys.argv) < 3 or sys.argv[1] != 'missing':
+        sys.exit("Usage: python library.py missing <german|german_sub|english_sub> [anime url]")
+    library = Library()
+    try:
+        rows = library.missing_downloads(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None)
+    except ValueError as e:
+        sys.exit(str(e))
+    for row in rows:
+        print(f"{row['anime_name']}: {content_title(row['season'], row['number'], row['title'])}")
+    print(f"{len(rows)} episodes without a {sys.argv[2]} download.")
+    library.close()
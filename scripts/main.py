@@ -1,14 +1,20 @@
 import os
-import requests
-import subprocess
 import shutil
-from bs4 import BeautifulSoup
+import httpx
+
+import config
+import catalog
+import pipeline
+import sync
+import job_queue
+import metrics
+import selection as content_selection
 
 # Constants
-base_url = 'https://aniworld.to'
+base_url = config.BASE_URL
 anime_list = []
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # Adjusted for two levels up
-DATA_DIR = os.path.join(BASE_DIR, 'data')
+DATA_DIR = config.DATA_DIR
 DOWNLOADS_DIR = os.path.join(BASE_DIR, 'downloads')
 
 # Logo
@@ -33,80 +39,73 @@ def clear_screen():
         os.system('clear')  # For Linux/Unix/Mac
 
 def clean_data_directory():
-    """Clean the /data directory by deleting all files inside it."""
+    """Clean the /data directory by deleting all files inside it (subfolders like the HTTP cache are kept)."""
     for filename in os.listdir(DATA_DIR):
         file_path = os.path.join(DATA_DIR, filename)
         if os.path.isfile(file_path):
             os.remove(file_path)
     print(f"Cleaned data directory: {DATA_DIR}")
 
-def run_script_in_background(script_path, *args):
-    """Run a Python script in the background using subprocess and wait for it to complete."""
-    subprocess.run(["python", script_path] + list(args), check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-
 def download_anime(anime):
     """Handle the download process for the selected anime."""
+    _, selection = ask_selection()
+    if selection is None:
+        return
     print("Cleaning previous data...")
     clean_data_directory()  # Step 1: Clean the data directory
+    metrics.reset()
     print("Gathering anime info...")
 
-    # Step 2: Execute info_getter.py
-    info_getter_script = os.path.join(os.path.dirname(__file__), "info_getter.py")
-    run_script_in_background(info_getter_script)
+    # Step 2: Scrape the series, seasons and movies
+    anime_data = pipeline.gather_anime_info(anime['url'], selection=selection)
+    if anime_data is None:
+        print(f"Could not gather info for {anime['name']}.")
+        return
     print("Gathering anime info... done.")
 
-    print("Extracting anime info...")
-    # Step 3: Execute extractor.py
-    extractor_script = os.path.join(os.path.dirname(__file__), "extractor.py")
-    run_script_in_background(extractor_script)
-    print("Extracting anime info... done.")
-
-    print("Gathering m3u8 URLs...")
-    # Step 4: Execute voe_extract.py
-    voe_extract_script = os.path.join(BASE_DIR, "services", "voe_dl", "voe_extract.py")
-    run_script_in_background(voe_extract_script)
-    print("Gathering m3u8 URLs... done.")
-
-    print("Downloading anime content...")
-    # Step 5: Execute voe_download.py
-    voe_download_script = os.path.join(BASE_DIR, "services", "voe_dl", "voe_download.py")
-    run_script_in_background(voe_download_script)
+    print("Extracting, resolving and downloading episodes...")
+    # Steps 3-5: every episode moves through extraction, m3u8 resolution and download on its own
+    pipeline.stream_anime_data(anime_data, selection=selection, anime_url=anime['url'])
     print(f"Download process for {anime['name']} has been completed.")
+    metrics.export('download')  # Stage times, per-host latency, retries and throughput of this run
+
+def ask_selection():
+    """Ask which part of the series to fetch; returns the spec and its Selection, or (None, None) if invalid."""
+    print("Selection, e.g. 'S2E5-S2E12, german_sub only, skip movies' (empty for everything)")
+    spec = input("Selection: ").strip()
+    try:
+        return spec, content_selection.parse_selection(spec)
+    except ValueError as e:
+        print(f"Invalid selection: {e}")
+        return None, None
+
+def queue_anime(anime):
+    """Add the anime, or the part of it picked by a selection spec, to the download queue."""
+    spec, selection = ask_selection()
+    if selection is None:
+        return
+    priority = input("Priority (higher runs first, empty for 0): ").strip()
+    if priority and not priority.lstrip('-').isdigit():
+        print("Please enter a number.")
+        return
+
+    connection = job_queue.connect()
+    job_id = job_queue.enqueue(connection, anime['url'], anime_name=anime['name'], selection=spec,
+                               priority=int(priority) if priority else 0)
+    connection.close()
+    print(f"Queued job {job_id}.")
 
 def fetch_anime_list():
-    """Scrape the anime list from the website and populate anime_list."""
-    url = f'{base_url}/animes'
+    """Load the anime list from the local catalog snapshot (or scrape it) and populate anime_list."""
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        series_container = soup.find('div', id='seriesContainer')
-        if series_container:
-            genres = series_container.find_all('div', class_='genre')
-            for genre in genres:
-                genre_name = genre.find('h3').text.strip()
-                anime_items = genre.find_all('li')
-
-                for anime_item in anime_items:
-                    anime_name = anime_item.text.strip()
-                    anime_url = anime_item.find('a')['href']
-                    full_anime_url = f"{base_url}{anime_url}"
-                    anime_list.append({
-                        'name': anime_name,
-                        'genre': genre_name,
-                        'url': full_anime_url
-                    })
-            print(f"Fetched {len(anime_list)} animes.")
-        else:
-            print("Could not find the anime list on the webpage.")
-    except requests.RequestException as e:
+        anime_list[:] = catalog.load_catalog()
+        print(f"Fetched {len(anime_list)} animes.")
+    except httpx.HTTPError as e:
         print(f"Error fetching anime list: {e}")
 
 def search_anime_by_name(search_term):
-    """Searches for animes by a partial match on the name."""
-    search_term = search_term.lower()
-    results = [anime for anime in anime_list if search_term in anime['name'].lower()]
+    """Searches for animes by name, tolerating typos and romanization differences."""
+    results = catalog.search(search_term, limit=catalog.SEARCH_LIMIT)
 
     if not results:
         print("No matches found.")
@@ -144,6 +143,8 @@ def anime_menu(anime):
         print("[2] Info (Coming Soon...)")
         print("[3] Options (Coming Soon...)")
         print("[4] Download")
+        print("[5] Sync new episodes")
+        print("[6] Add to download queue")
         print("[0] Exit")
 
         choice = input("Enter your choice: ")
@@ -158,6 +159,12 @@ def anime_menu(anime):
             back_or_exit()
         elif choice == "4":
             download_anime(anime)  # Start the download process
+        elif choice == "5":
+            sync.sync_anime(anime['url'])  # Only fetch what changed since the last sync
+            back_or_exit()
+        elif choice == "6":
+            queue_anime(anime)
+            back_or_exit()
         elif choice == "0":
             print("Exiting...")
             exit()
@@ -181,6 +188,8 @@ def main_menu():
         print(logo)
         print("Options:")
         print("[1] Search")
+        print("[2] Show download queue")
+        print("[3] Run download queue")
         print("[0] Exit")
 
         choice = input("Enter your choice: ")
@@ -191,6 +200,12 @@ def main_menu():
             anime = search_anime()
             if anime:
                 anime_menu(anime)
+        elif choice == "2":
+            job_queue.print_jobs()
+            back_or_exit()
+        elif choice == "3":
+            job_queue.run_queue()  # Runs until every queued job is done or failed
+            back_or_exit()
         elif choice == "0":
             print("Exiting...")
             break
@@ -0,0 +1,184 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+import config
+
+# Paths
+METRICS_DIR = os.path.join(config.DATA_DIR, 'metrics')
+# Point this into the node exporter's --collector.textfile.directory to scrape the last run
+TEXTFILE_PATH = os.environ.get('ANI_TOOL_METRICS_TEXTFILE', os.path.join(METRICS_DIR, 'ani_tool.prom'))
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)  # Seconds, upper bounds
+
+_lock = threading.Lock()
+_started_at = time.time()
+_stages = {}       # stage -> {'first_start', 'last_end', 'busy', 'items'}
+_hosts = {}        # host -> {'requests', 'errors', 'status': {code: n}, 'buckets': [...], 'sum'}
+_retries = {}      # stage -> count
+_failures = {}     # stage -> count
+_downloads = []    # {'episode', 'bytes', 'seconds'}
+
+def reset():
+    """Forget everything recorded so far, e.g. at the start of a new run."""
+    global _started_at
+    with _lock:
+        _started_at = time.time()
+        for table in (_stages, _hosts, _retries, _failures):
+            table.clear()
+        _downloads.clear()
+
+@contextmanager
+def stage(name):
+    """Time one unit of work of a stage. Wall time spans from the first start to the last end."""
+    start = time.time()
+    try:
+        yield
+    finally:
+        end = time.time()
+        with _lock:
+            entry = _stages.setdefault(name, {'first_start': start, 'last_end': end, 'busy': 0.0, 'items': 0})
+            entry['first_start'] = min(entry['first_start'], start)
+            entry['last_end'] = max(entry['last_end'], end)
+            entry['busy'] += end - start
+            entry['items'] += 1
+
+def _host_entry(host):
+    return _hosts.setdefault(host, {'requests': 0, 'errors': 0, 'status': {}, 'buckets': [0] * len(LATENCY_BUCKETS), 'sum': 0.0})
+
+def record_request(host, seconds, status_code):
+    """Count one HTTP response from host and add its latency (time to headers) to the histogram."""
+    with _lock:
+        entry = _host_entry(host)
+        entry['requests'] += 1
+        entry['status'][str(status_code)] = entry['status'].get(str(status_code), 0) + 1
+        entry['sum'] += seconds
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                entry['buckets'][index] += 1
+                break
+
+def record_error(host):
+    """Count a request to host that failed without a response (timeout, connection error)."""
+    with _lock:
+        _host_entry(host)['errors'] += 1
+
+def count_retry(stage_name):
+    with _lock:
+        _retries[stage_name] = _retries.get(stage_name, 0) + 1
+
+def count_failure(stage_name):
+    with _lock:
+        _failures[stage_name] = _failures.get(stage_name, 0) + 1
+
+def record_download(episode, size, seconds):
+    """Record the size and transfer time of one finished download."""
+    with _lock:
+        _downloads.append({'episode': episode, 'bytes': size, 'seconds': round(seconds, 3)})
+
+def summary():
+    """Everything recorded since the last reset, as a JSON-serializable dict."""
+    with _lock:
+        stages = {
+            name: {
+                'wall_seconds': round(entry['last_end'] - entry['first_start'], 3),
+                'busy_seconds': round(entry['busy'], 3),
+                'items': entry['items'],
+            }
+            for name, entry in _stages.items()
+        }
+        hosts = {}
+        for host, entry in _hosts.items():
+            histogram, cumulative = {}, 0
+            for bound, count in zip(LATENCY_BUCKETS, entry['buckets']):
+                cumulative += count
+                histogram[str(bound)] = cumulative
+            histogram['+Inf'] = entry['requests']
+            hosts[host] = {
+                'requests': entry['requests'],
+                'errors': entry['errors'],
+                'status': dict(entry['status']),
+                'latency_sum_seconds': round(entry['sum'], 3),
+                'latency_buckets': histogram,
+            }
+        downloads = [
+            dict(download, bytes_per_second=round(download['bytes'] / download['seconds']) if download['seconds'] else None)
+            for download in _downloads
+        ]
+        return {
+            'started_at': _started_at,
+            'finished_at': time.time(),
+            'stages': stages,
+            'hosts': hosts,
+            'retries': dict(_retries),
+            'failures': dict(_failures),
+            'downloads': downloads,
+            'downloaded_bytes': sum(download['bytes'] for download in downloads),
+        }
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def prometheus_text(data):
+    """Render a summary() dict in the Prometheus text exposition format."""
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP ani_tool_{name} {help_text}")
+        lines.append(f"# TYPE ani_tool_{name} {kind}")
+        for labels, value in samples:
+            label_text = ','.join(f'{key}="{_label(label)}"' for key, label in labels.items())
+            lines.append(f"ani_tool_{name}{{{label_text}}} {value}" if label_text else f"ani_tool_{name} {value}")
+
+    stages, hosts = data['stages'], data['hosts']
+    metric('run_finished_timestamp_seconds', 'gauge', 'End of the last run.', [({}, round(data['finished_at'], 3))])
+    metric('stage_wall_seconds', 'gauge', 'Wall time from the first to the last item of a stage.',
+           [({'stage': name}, entry['wall_seconds']) for name, entry in stages.items()])
+    metric('stage_busy_seconds', 'gauge', 'Summed time spent on the items of a stage.',
+           [({'stage': name}, entry['busy_seconds']) for name, entry in stages.items()])
+    metric('stage_items', 'gauge', 'Items processed by a stage.',
+           [({'stage': name}, entry['items']) for name, entry in stages.items()])
+    metric('http_responses', 'gauge', 'HTTP responses per host and status code.',
+           [({'host': host, 'code': code}, count) for host, entry in hosts.items() for code, count in entry['status'].items()])
+    metric('http_errors', 'gauge', 'HTTP requests that got no response, per host.',
+           [({'host': host}, entry['errors']) for host, entry in hosts.items()])
+
+    lines.append('# HELP ani_tool_http_latency_seconds Time to response headers per host.')
+    lines.append('# TYPE ani_tool_http_latency_seconds histogram')
+    for host, entry in hosts.items():
+        for bound, count in entry['latency_buckets'].items():
+            lines.append(f'ani_tool_http_latency_seconds_bucket{{host="{_label(host)}",le="{bound}"}} {count}')
+        lines.append(f'ani_tool_http_latency_seconds_sum{{host="{_label(host)}"}} {entry["latency_sum_seconds"]}')
+        lines.append(f'ani_tool_http_latency_seconds_count{{host="{_label(host)}"}} {entry["requests"]}')
+
+    metric('retries', 'gauge', 'Retried attempts per stage.', [({'stage': name}, count) for name, count in data['retries'].items()])
+    metric('failures', 'gauge', 'Items given up on per stage.', [({'stage': name}, count) for name, count in data['failures'].items()])
+    metric('downloaded_bytes', 'gauge', 'Bytes of finished downloads.', [({}, data['downloaded_bytes'])])
+    metric('downloaded_files', 'gauge', 'Finished downloads.', [({}, len(data['downloads']))])
+    transfer_seconds = sum(download['seconds'] for download in data['downloads'])
+    metric('download_throughput_bytes_per_second', 'gauge', 'Average throughput of the finished downloads.',
+           [({}, round(data['downloaded_bytes'] / transfer_seconds) if transfer_seconds else 0)])
+    return '\n'.join(lines) + '\n'
+
+def _write_atomic(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as output:
+        output.write(text)
+    os.replace(tmp_path, path)
+
+def export(run_name='run'):
+    """Write the JSON summary of this run to data/metrics/ and refresh the Prometheus textfile."""
+    data = summary()
+    data['run'] = run_name
+    json_path = os.path.join(METRICS_DIR, f"{run_name}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    _write_atomic(json_path, json.dumps(data, ensure_ascii=False, indent=4))
+    _write_atomic(TEXTFILE_PATH, prometheus_text(data))
+
+    for name, entry in data['stages'].items():
+        print(f"{name:>10}: {entry['wall_seconds']:.1f}s wall, {entry['items']} items, "
+              f"{data['retries'].get(name, 0)} retries, {data['failures'].get(name, 0)} failed")
+    print(f"Metrics saved to {json_path}")
+    return json_path
@@ -0,0 +1,173 @@
+import os
+import sys
+import queue
+import argparse
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+
+# Make the VOE service modules importable next to the scripts in this folder
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VOE_DL_DIR = os.path.join(BASE_DIR, 'services', 'voe_dl')
+if VOE_DL_DIR not in sys.path:
+    sys.path.append(VOE_DL_DIR)
+
+import metrics
+import selection as content_selection
+import info_getter
+import extractor
+import library
+import voe_extract
+import voe_download
+from manifest import DownloadManifest
+
+RESOLVE_WORKERS = 4  # Episodes whose VOE links are resolved at the same time
+
+def gather_anime_info(anime_url, debug=False, selection=None):
+    """Stage 1: scrape the series and the selected seasons and movies into the anime data dict."""
+    with metrics.stage('info'):
+        return info_getter.collect_anime_data(anime_url, debug, selection=selection)
+
+def extract_anime_links(anime_data, debug=False):
+    """Stage 2: collect the hoster links per language for every movie and episode."""
+    with metrics.stage('extract'):
+        return extractor.extract_content_links(anime_data, debug)
+
+def gather_m3u8_urls(content_links, retries=3, debug=False, selection=None):
+    """Stage 3: resolve the hoster links of the selected languages into m3u8 URLs."""
+    with metrics.stage('resolve'):
+        return voe_extract.resolve_m3u8_links(content_links, retries=retries, debug=debug, selection=selection)
+
+def download_anime_streams(m3u8_data, anime_data, retries=3, debug=False):
+    """Stage 4: download every resolved m3u8 URL into the downloads folder; returns the failed episode names."""
+    return voe_download.download_anime_data(m3u8_data, anime_data, retries=retries, debug=debug)
+
+def stream_anime_data(anime_data, retries=3, debug=False, extract_workers=extractor.MAX_WORKERS,
+                      resolve_workers=RESOLVE_WORKERS, download_workers=voe_download.MAX_WORKERS,
+                      limits=None, owner=None, selection=None, anime_url=None, store=None):
+    """Move every episode through extract -> resolve -> download on its own, without stage barriers.
+
+    Extraction threads hand each episode to the resolvers through a bounded queue, and the
+    resolvers queue its downloads right away, so the first episode downloads while the
+    rest of the series is still being scraped. Returns the content links, the m3u8 data
+    and the names of episodes with failed downloads.
+
+    limits optionally maps 'scrape', 'resolve' and 'download' to limiters shared with other
+    runs (see job_queue.FairLimiter); owner identifies this run to them. selection limits
+    the languages that are resolved; seasons and episodes are picked by gather_anime_info.
+
+    With anime_url the series, its links, m3u8 URLs and finished downloads are recorded in
+    the library (store, or a Library opened for this run).
+    """
+    def slot(stage):
+        return limits[stage].slot(owner) if limits else nullcontext()
+
+    own_store = anime_url is not None and store is None
+    if own_store:
+        store = library.Library()
+    episode_ids = {}
+    if anime_url is not None:
+        anime_id = store.save_anime(anime_url, anime_data)
+        episode_ids = {title: row['id'] for title, row in store.episodes(anime_id).items()}
+
+    content_pages = extractor.list_content_pages(anime_data)
+    title_index = voe_download.index_titles(anime_data)
+    anime_dir = voe_download.prepare_anime_dir(anime_data)
+    manifest = DownloadManifest(anime_dir)
+    scheduler = voe_download.DownloadScheduler(max_workers=download_workers, retries=retries, debug=debug,
+                                               limiter=limits['download'] if limits else None, owner=owner)
+
+    resolve_queue = queue.Queue(maxsize=resolve_workers * 4)
+    content_links = {}
+    m3u8_data = {}
+    counts = {'total': 0, 'skipped': 0}
+    lock = threading.Lock()
+
+    def extract(content_page):
+        content_title, content_url = content_page
+        with slot('scrape'), metrics.stage('extract'):
+            links = extractor.extract_stream_links(content_url, debug)
+        if content_title in episode_ids:
+            store.save_links(episode_ids[content_title], links)
+        with lock:
+            content_links[content_title] = links
+        resolve_queue.put((content_title, links))
+
+    def resolve_and_queue_downloads():
+        while True:
+            item = resolve_queue.get()
+            if item is None:
+                break
+            content_title, links = item
+            try:
+                with slot('resolve'), metrics.stage('resolve'):
+                    m3u8_links, _ = voe_extract.resolve_episode_links(content_title, links, retries, debug, selection)
+                record = None
+                if content_title in episode_ids:
+                    episode_id = episode_ids[content_title]
+                    store.save_m3u8(episode_id, m3u8_links)
+                    record = (lambda language, path, url, duration, episode_id=episode_id:
+                              store.record_download(episode_id, language, path, url, duration))
+                queued, skipped = voe_download.queue_episode_downloads(
+                    scheduler, manifest, anime_dir, title_index, content_title, m3u8_links, debug, on_success=record)
+                with lock:
+                    m3u8_data[content_title] = m3u8_links
+                    counts['total'] += queued
+                    counts['skipped'] += skipped
+            except Exception as e:
+                print(f"Failed to process {content_title}: {e}")
+
+    resolvers = [threading.Thread(target=resolve_and_queue_downloads, daemon=True) for _ in range(resolve_workers)]
+    for resolver in resolvers:
+        resolver.start()
+
+    try:
+        try:
+            with ThreadPoolExecutor(max_workers=extract_workers) as executor:
+                list(executor.map(extract, content_pages))
+        finally:
+            # Also when an extraction failed: stop the resolvers and let the queued downloads finish
+            for _ in resolvers:
+                resolve_queue.put(None)
+            for resolver in resolvers:
+                resolver.join()
+            downloaded_episodes, failed_episodes = scheduler.wait()
+            voe_download.remove_empty_folders(anime_dir)
+        if anime_url is not None:
+            store.mark_done(anime_id, 'extracted')
+            store.mark_done(anime_id, 'resolved')
+    finally:
+        if own_store:
+            store.close()
+
+    print(f"Download completed. Total episodes: {counts['total']}, Downloaded: {downloaded_episodes}, "
+          f"Already present: {counts['skipped']}, Failed: {failed_episodes}")
+
+    # Report in S/E order, whatever order the episodes finished in
+    titles = [content_title for content_title, _ in content_pages]
+    return {
+        'content_links': {title: content_links.get(title, {}) for title in titles},
+        'm3u8_data': {title: m3u8_data[title] for title in titles if title in m3u8_data},
+        'failed': scheduler.failed_keys,
+    }
+
+def run_pipeline(anime_url, retries=3, debug=False, selection=None):
+    """Gather the series info, then stream every selected episode through extract -> resolve -> download."""
+    metrics.reset()
+    anime_data = gather_anime_info(anime_url, debug, selection)
+    if anime_data is None:
+        print(f"Could not gather anime info for {anime_url}.")
+        return None
+
+    stream_anime_data(anime_data, retries=retries, debug=debug, selection=selection, anime_url=anime_url)
+    metrics.export('pipeline')
+    return anime_data
+
+if __name__ == "__main__":
+    # Example usage: python pipeline.py /anime/stream/death-note [/anime/stream/...] [--select "S1E1-S1E3, german only"]
+    parser = argparse.ArgumentParser(description='Download one or more series')
+    parser.add_argument('urls', nargs='*', default=['/anime/stream/death-note'])
+    parser.add_argument('--select', default='', help='e.g. "S2E5-S2E12, german_sub only, skip movies"')
+    args = parser.parse_args()
+    for url in args.urls:
+        run_pipeline(url, debug=True, selection=content_selection.parse_selection(args.select))
@@ -0,0 +1,152 @@
+import os
+import re
+import sys
+import json
+import atexit
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import httpx
+
+import config
+import http_client
+
+CACHE_DIR = os.path.join(config.DATA_DIR, 'redirects')
+CACHE_PATH = os.path.join(CACHE_DIR, 'redirect_targets.json')
+
+MAX_AGE = 30 * 24 * 60 * 60  # Follow a redirect again after this many seconds, in case its target moved
+MAX_WORKERS = 16  # Redirects followed at the same time by resolve_all
+SAVE_INTERVAL = 10  # Seconds between writes of the cache file; the rest is written at exit
+
+REDIRECT_PATTERN = re.compile(r'/redirect/(\d+)')
+
+_lock = threading.Lock()
+_entries = None
+_dirty = False
+_saved_at = 0.0
+
+def redirect_key(redirect_url):
+    """The cache key of a redirect URL: host and /redirect/<id> number, or the URL itself."""
+    match = REDIRECT_PATTERN.search(redirect_url)
+    return f"{urlparse(redirect_url).netloc}/{match.group(1)}" if match else redirect_url
+
+def _load():
+    global _entries
+    if _entries is None:
+        try:
+            with open(CACHE_PATH, 'r', encoding='utf-8') as cache_file:
+                _entries = json.load(cache_file)
+        except (OSError, ValueError):
+            _entries = {}
+    return _entries
+
+def _save(force=False):
+    # Called with _lock held; writes at most every SAVE_INTERVAL seconds unless forced
+    global _dirty, _saved_at
+    if not _dirty or (not force and time.time() - _saved_at < SAVE_INTERVAL):
+        return
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # Drop targets too old to be used, they would be followed again anyway
+    oldest = time.time() - MAX_AGE
+    live = {key: entry for key, entry in _entries.items() if entry['resolved_at'] > oldest}
+    tmp_path = f"{CACHE_PATH}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as cache_file:
+        json.dump(live, cache_file, ensure_ascii=False)
+    os.replace(tmp_path, CACHE_PATH)
+    _dirty = False
+    _saved_at = time.time()
+
+def flush():
+    """Write pending cache entries now (also done at exit)."""
+    with _lock:
+        if _entries is not None:
+            _save(force=True)
+
+atexit.register(flush)
+
+def lookup(redirect_url):
+    """Return the known final URL of a redirect, or None if it was never followed or is too old."""
+    with _lock:
+        entry = _load().get(redirect_key(redirect_url))
+    if entry is None or time.time() - entry['resolved_at'] > MAX_AGE:
+        return None
+    return entry['final_url']
+
+def record(redirect_url, final_url):
+    """Remember where a redirect ends, e.g. after a GET that followed it anyway."""
+    record_all({redirect_url: final_url})
+
+def record_all(targets):
+    """Remember {redirect_url: final_url}; the cache file is written in batches."""
+    global _dirty
+    resolved_at = time.time()
+    targets = {url: final_url for url, final_url in targets.items() if final_url and final_url != url}
+    if not targets:
+        return
+    with _lock:
+        _dirty = True
+        entries = _load()
+        for redirect_url, final_url in targets.items():
+            entries[redirect_key(redirect_url)] = {'final_url': final_url, 'resolved_at': resolved_at}
+        _save()
+
+def forget(redirect_url):
+    """Drop a redirect whose target stopped working, so it is followed again."""
+    global _dirty
+    with _lock:
+        if _load().pop(redirect_key(redirect_url), None) is not None:
+            _dirty = True
+            _save()
+
+def follow(redirect_url, retries=3, debug=False):
+    """Follow a redirect without downloading the page it ends on; returns the final URL or None.
+
+    A HEAD request is tried first; once it left the redirect, its final URL is the target,
+    whatever the hoster answers to HEAD. If the redirect itself refuses HEAD (405, 501, ...)
+    a GET is sent instead and closed as soon as the headers of the last hop arrive.
+    """
+    try:
+        response = http_client.head(redirect_url, attempts=retries)
+        if response.is_error and str(response.url) == redirect_url:
+            response = http_client.get_headers(redirect_url, attempts=retries)
+    except httpx.HTTPError as e:
+        print(f"Failed to follow redirect {redirect_url}: {e}")
+        return None
+    if response.is_error and str(response.url) == redirect_url:
+        print(f"Failed to follow redirect {redirect_url}: HTTP {response.status_code}")
+        return None
+    if debug:
+        print(f"Followed redirect: {redirect_url} -> {response.url}")
+    return str(response.url)
+
+def resolve(redirect_url, retries=3, debug=False):
+    """Return the final URL of a redirect, following it only if it is not cached yet."""
+    final_url = lookup(redirect_url)
+    if final_url is None:
+        final_url = follow(redirect_url, retries, debug)
+        record(redirect_url, final_url)
+    elif debug:
+        print(f"Known redirect: {redirect_url} -> {final_url}")
+    return final_url
+
+def resolve_all(redirect_urls, retries=3, debug=False, max_workers=MAX_WORKERS):
+    """Resolve many redirects at once; returns {redirect_url: final_url or None}.
+
+    Known redirects come from the cache, the rest are followed concurrently (each distinct
+    one once) and written to the cache together.
+    """
+    urls = list(dict.fromkeys(redirect_urls))
+    targets = {url: lookup(url) for url in urls}
+    missing = [url for url, final_url in targets.items() if final_url is None]
+    if missing:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(missing))) as executor:
+            followed = dict(zip(missing, executor.map(lambda url: follow(url, retries, debug), missing)))
+        record_all(followed)
+        targets.update(followed)
+    return targets
+
+if __name__ == "__main__":
+    # Example usage: python redirects.py https://aniworld.to/redirect/123456 [...]
+    for url, final_url in resolve_all(sys.argv[1:], debug=True).items():
+        print(f"{url} -> {final_url}")
@@ -0,0 +1,196 @@
+import os
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+import httpx
+
+import metrics
+
+# Per host: steady request rate and burst size of the token bucket. Only a ceiling against
+# runaway loops; how hard a host is pushed is decided by the adaptive window below.
+RATE_PER_HOST = float(os.environ.get('ANI_TOOL_RATE_PER_HOST', '100'))
+BURST_PER_HOST = max(int(RATE_PER_HOST), 1)
+# Per host: AIMD concurrency window (requests in flight)
+INITIAL_CONCURRENCY = 8
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 32
+# Retries: jittered exponential backoff, or the server's Retry-After
+MAX_ATTEMPTS = 4
+BACKOFF_BASE = 1.0   # Seconds, doubled per attempt, full jitter
+BACKOFF_CAP = 30.0
+MAX_RETRY_AFTER = 120.0
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+# Circuit breaker: stop sending to a host after this many failures in a row, for COOLDOWN seconds
+FAILURE_THRESHOLD = 8
+COOLDOWN = 30.0
+
+class CircuitOpen(httpx.TransportError):
+    """Raised instead of sending a request to a host whose circuit breaker is open."""
+
+class TokenBucket:
+    """Allows rate requests per second on average, with bursts of up to burst requests."""
+
+    def __init__(self, rate=RATE_PER_HOST, burst=BURST_PER_HOST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class AdaptiveLimiter:
+    """AIMD concurrency window: grows by one per window of successes, halves on 429/5xx/timeouts."""
+
+    def __init__(self, initial=INITIAL_CONCURRENCY, minimum=MIN_CONCURRENCY, maximum=MAX_CONCURRENCY):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self.last_decrease = 0.0
+        self.cond = threading.Condition()
+
+    def acquire(self):
+        """Wait for a free slot; returns the start time to hand back to release()."""
+        with self.cond:
+            while self.in_flight >= int(self.limit):
+                self.cond.wait()
+            self.in_flight += 1
+            return time.monotonic()
+
+    def release(self, started, overloaded):
+        with self.cond:
+            self.in_flight -= 1
+            if overloaded:
+                # Requests sent before the last decrease saw the old window; count each overload once
+                if started >= self.last_decrease:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self.last_decrease = time.monotonic()
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self.cond.notify_all()
+
+class CircuitBreaker:
+    """Closed -> open after FAILURE_THRESHOLD failures in a row -> one trial request after COOLDOWN."""
+
+    def __init__(self, threshold=FAILURE_THRESHOLD, cooldown=COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    def remaining(self):
+        """Seconds until a request may be sent, 0 if it may be sent now (claims the trial slot)."""
+        with self.lock:
+            if self.opened_at is None:
+                return 0.0
+            left = self.opened_at + self.cooldown - time.monotonic()
+            if left > 0:
+                return left
+            if self.trial_running:
+                return 1.0
+            self.trial_running = True
+            return 0.0
+
+    def record(self, success):
+        with self.lock:
+            self.trial_running = False
+            if success:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+class HostPolicy:
+    """Rate limit, concurrency window and circuit breaker of one host."""
+
+    def __init__(self):
+        # Read the module settings now, so they can be changed before the first request
+        self.bucket = TokenBucket(RATE_PER_HOST, BURST_PER_HOST)
+        self.limiter = AdaptiveLimiter(INITIAL_CONCURRENCY, MIN_CONCURRENCY, MAX_CONCURRENCY)
+        self.breaker = CircuitBreaker(FAILURE_THRESHOLD, COOLDOWN)
+
+_policies = {}
+_policies_lock = threading.Lock()
+
+def policy_for(host):
+    with _policies_lock:
+        if host not in _policies:
+            _policies[host] = HostPolicy()
+        return _policies[host]
+
+def retry_after(response):
+    """Seconds the server asked us to wait (Retry-After as seconds or HTTP date), or None."""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER)
+
+def backoff(attempt):
+    """Full-jitter exponential backoff for the given (1-based) attempt."""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** (attempt - 1)))
+
+def send(send_request, url, attempts=MAX_ATTEMPTS):
+    """Send a request through the policy of its host, retrying transport errors, 429 and 5xx.
+
+    send_request() performs one attempt and returns the response. Redirects followed by the
+    client count against the first host. Returns the last response (also when it is still a
+    429/5xx after the last attempt) or raises the last transport error.
+    """
+    host = httpx.URL(url).host
+    policy = policy_for(host)
+    attempts = max(attempts or MAX_ATTEMPTS, 1)
+    for attempt in range(1, attempts + 1):
+        wait = policy.breaker.remaining()
+        if wait:
+            if attempt == attempts:
+                raise CircuitOpen(f"Circuit breaker open for {host}, not sending {url}")
+            metrics.count_retry('http')
+            time.sleep(wait)
+            continue
+
+        policy.bucket.acquire()
+        started = policy.limiter.acquire()
+        response = error = None
+        try:
+            response = send_request()
+        except httpx.TransportError as e:
+            metrics.record_error(host)
+            error = e
+        finally:
+            overloaded = error is not None or (response is not None and response.status_code in RETRY_STATUS_CODES)
+            policy.limiter.release(started, overloaded)
+            policy.breaker.record(not overloaded)
+
+        if not overloaded:
+            return response
+        if attempt == attempts:
+            if error is not None:
+                raise error
+            return response
+
+        delay = retry_after(response) if response is not None else None
+        metrics.count_retry('http')
+        time.sleep(delay if delay is not None else backoff(attempt))
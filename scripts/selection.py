@@ -0,0 +1,123 @@
+import re
+
+# Download folder per extracted language name; languages without a folder are never downloaded
+LANGUAGE_FOLDERS = {
+    'deutsch': 'german',
+    'mit-untertitel-deutsch': 'german_sub',
+    'english_sub': 'english_sub'  # If there's any entry for english_sub
+}
+
+# Names accepted in a selection spec -> download folder
+LANGUAGE_ALIASES = {
+    'german': 'german', 'deutsch': 'german', 'ger': 'german', 'dub': 'german',
+    'german_sub': 'german_sub', 'gersub': 'german_sub', 'sub': 'german_sub',
+    'english_sub': 'english_sub', 'engsub': 'english_sub',
+}
+
+# Download folder -> language code used in the season page flags (see info_getter.parse_season_page)
+FLAG_CODES = {'german': 'ger', 'german_sub': 'gersub', 'english_sub': 'engsub'}
+
+POINT_PATTERN = re.compile(r'^(?:s(\d+))?(?:e(\d+))?$')
+LAST_EPISODE = float('inf')
+
+class Selection:
+    """Which seasons, episodes, movies and languages of a series to crawl, resolve and download."""
+
+    def __init__(self, ranges=None, movies=None, episodes=True, languages=None):
+        self.ranges = ranges or []  # [((season, episode), (season, episode))], inclusive
+        self.episodes = episodes    # False: no episodes at all ("movies only")
+        # Movies are included by default, unless episodes were picked explicitly
+        self.movies = movies if movies is not None else not self.ranges
+        self.languages = set(languages) if languages else set(LANGUAGE_FOLDERS.values())
+
+    def wants_season(self, season_number):
+        if not self.episodes:
+            return False
+        if not self.ranges:
+            return True
+        return any(start[0] <= season_number <= end[0] for start, end in self.ranges)
+
+    def wants_episode(self, season_number, episode_number):
+        if not self.episodes:
+            return False
+        if not self.ranges:
+            return True
+        return any(start <= (season_number, episode_number) <= end for start, end in self.ranges)
+
+    def wants_movie(self, movie_number):
+        return self.movies
+
+    def wants_language(self, language):
+        """True for an extracted language name (e.g. 'mit-untertitel-deutsch') that should be resolved."""
+        return LANGUAGE_FOLDERS.get(language) in self.languages
+
+    def wants_flags(self, flag_codes):
+        """True if a season page row offers a wanted language (rows without flags are kept)."""
+        if flag_codes == 'None':
+            return True
+        wanted = {FLAG_CODES[folder] for folder in self.languages}
+        return bool(wanted & set(flag_codes.split(',')))
+
+def _parse_point(text, start=None):
+    """Parse 'S2E5', 'S2', 'E12' or '12' into (season, episode or None)."""
+    if text.isdigit():
+        # A bare number continues the start: an episode if it named one, else a season
+        if start is not None and start[1] is not None:
+            return start[0], int(text)
+        return int(text), None
+    match = POINT_PATTERN.match(text)
+    if not match or not any(match.groups()):
+        raise ValueError(f"Not a season/episode: {text!r}")
+    season, episode = match.groups()
+    if season is None:
+        if start is None:
+            raise ValueError(f"Range has to start with a season: {text!r}")
+        season = start[0]
+    return int(season), int(episode) if episode else None
+
+def parse_selection(spec):
+    """Parse a spec like 'S2E5-S2E12, german_sub only, skip movies' into a Selection.
+
+    Clauses are separated by commas: seasons or episodes ('S2', 'S2E5', 'S2E5-S2E12',
+    'S2E5-12', 'S1-S3'), 'movies', 'movies only', 'skip movies' and languages
+    ('german', 'german_sub', 'english_sub', optionally followed by 'only').
+    An empty spec selects everything.
+    """
+    ranges, languages = [], set()
+    movies, episodes = None, True
+    for clause in (spec or '').lower().split(','):
+        clause = ' '.join(clause.split())
+        if not clause:
+            continue
+        if clause in ('skip movies', 'no movies', 'without movies'):
+            movies = False
+            continue
+        if clause in ('movies', 'with movies'):
+            movies = True
+            continue
+        if clause == 'movies only':
+            movies, episodes = True, False
+            continue
+
+        words = clause.split()
+        if words[-1] == 'only' and len(words) > 1:
+            words = words[:-1]
+        if all(word in LANGUAGE_ALIASES for word in words):
+            languages.update(LANGUAGE_ALIASES[word] for word in words)
+            continue
+
+        parts = clause.replace(' ', '').split('-')
+        if len(parts) > 2:
+            raise ValueError(f"Unknown selection: {clause!r}")
+        start = _parse_point(parts[0])
+        end = _parse_point(parts[1], start) if len(parts) == 2 else start
+        start = (start[0], start[1] or 0)
+        end = (end[0], end[1] if end[1] is not None else LAST_EPISODE)
+        if end < start:
+            raise ValueError(f"Range ends before it starts: {clause!r}")
+        ranges.append((start, end))
+    return Selection(ranges, movies, episodes, languages)
+
+def describe(spec):
+    """Short label of a spec for lists and log lines."""
+    return spec.strip() if spec and spec.strip() else 'everything'
@@ -0,0 +1,136 @@
+import os
+import sys
+import json
+import copy
+
+import config
+import pipeline
+import extractor
+import metrics
+import selection as content_selection
+import resolvers  # Importable once pipeline added services/voe_dl to the path
+
+# Paths
+SYNC_DIR = os.path.join(config.DATA_DIR, 'sync')
+
+def state_path(anime_url):
+    """Path of the stored listing for a series, named after its URL slug."""
+    slug = anime_url.rstrip('/').rsplit('/', 1)[-1]
+    return os.path.join(SYNC_DIR, f"{slug}.json")
+
+def load_state(anime_url):
+    """Return the anime data stored by the last sync of this series, or None."""
+    try:
+        with open(state_path(anime_url), 'r', encoding='utf-8') as state_file:
+            return json.load(state_file)
+    except (OSError, ValueError):
+        return None
+
+def save_state(anime_url, anime_data):
+    """Store the anime data of this sync atomically."""
+    os.makedirs(SYNC_DIR, exist_ok=True)
+    path = state_path(anime_url)
+    with open(f"{path}.tmp", 'w', encoding='utf-8') as state_file:
+        json.dump(anime_data, state_file, ensure_ascii=False, indent=4)
+    os.replace(f"{path}.tmp", path)
+
+def _languages(entry):
+    return set(entry.get('languages', 'None').split(',')) - {'None'}
+
+def _needs_sync(old_entry, new_entry, url_key):
+    """True for new entries, changed titles/URLs and entries with newly added languages."""
+    if old_entry is None:
+        return True
+    if old_entry.get(url_key) != new_entry.get(url_key):
+        return True
+    if old_entry.get('episode_title', old_entry.get('movie_name')) != new_entry.get('episode_title', new_entry.get('movie_name')):
+        return True
+    return bool(_languages(new_entry) - _languages(old_entry))
+
+def diff_anime_data(old_data, new_data):
+    """Return a copy of new_data holding only the movies and episodes that changed since old_data."""
+    delta = copy.deepcopy(new_data)
+    if old_data is None:
+        return delta
+
+    old_movies = {movie['movie_number']: movie for movie in old_data.get('movies', {}).get('movie_list', [])}
+    delta['movies']['movie_list'] = [
+        movie for movie in new_data.get('movies', {}).get('movie_list', [])
+        if _needs_sync(old_movies.get(movie['movie_number']), movie, 'movie_url')
+    ]
+    delta['movies']['total_movies'] = len(delta['movies']['movie_list'])
+
+    delta['seasons'] = {}
+    for season_name, season_data in new_data.get('seasons', {}).items():
+        old_episodes = old_data.get('seasons', {}).get(season_name, {}).get('episodes', {})
+        episodes = {
+            episode_id: episode_data
+            for episode_id, episode_data in season_data.get('episodes', {}).items()
+            if _needs_sync(old_episodes.get(episode_id), episode_data, 'episode_url')
+        }
+        if episodes:
+            delta['seasons'][season_name] = {'total_episodes': len(episodes), 'episodes': episodes}
+    delta['total_episodes'] = sum(season['total_episodes'] for season in delta['seasons'].values())
+    return delta
+
+def merge_state(old_data, new_data, delta, failed_titles):
+    """State to store after a sync: new_data, except entries of the delta that failed keep their old state."""
+    state = copy.deepcopy(new_data)
+    failed_urls = {url for title, url in extractor.list_content_pages(delta) if title in failed_titles}
+    old_data = old_data or {}
+
+    old_movies = {movie['movie_number']: movie for movie in old_data.get('movies', {}).get('movie_list', [])}
+    state['movies']['movie_list'] = [
+        old_movies.get(movie['movie_number']) if movie['movie_url'] in failed_urls else movie
+        for movie in state['movies']['movie_list']
+    ]
+    state['movies']['movie_list'] = [movie for movie in state['movies']['movie_list'] if movie is not None]
+
+    for season_name, season_data in state.get('seasons', {}).items():
+        old_episodes = old_data.get('seasons', {}).get(season_name, {}).get('episodes', {})
+        for episode_id, episode_data in list(season_data['episodes'].items()):
+            if episode_data['episode_url'] in failed_urls:
+                if episode_id in old_episodes:
+                    season_data['episodes'][episode_id] = old_episodes[episode_id]
+                else:
+                    del season_data['episodes'][episode_id]
+    return state
+
+def sync_anime(anime_url, retries=3, debug=False):
+    """Download only the movies and episodes that are new or changed since the last sync of this series."""
+    metrics.reset()
+    new_data = pipeline.gather_anime_info(anime_url, debug)
+    if new_data is None:
+        print(f"Could not gather anime info for {anime_url}.")
+        return None
+
+    old_data = load_state(anime_url)
+    delta = diff_anime_data(old_data, new_data)
+    changed = delta['movies']['total_movies'] + delta['total_episodes']
+    if changed == 0:
+        print(f"{new_data['anime_name']} is up to date.")
+        save_state(anime_url, new_data)
+        return delta
+
+    print(f"{new_data['anime_name']}: {changed} new or changed movies/episodes.")
+    result = pipeline.stream_anime_data(delta, retries=retries, debug=debug, anime_url=anime_url)
+    content_links, m3u8_data = result['content_links'], result['m3u8_data']
+    failed_titles = set(result['failed'])
+
+    # Pages that gave no hoster links (fetch failed, or nothing uploaded yet) and hoster links
+    # that could not be resolved count as failed too, so the next sync retries them
+    for title, languages in content_links.items():
+        if not languages:
+            failed_titles.add(title)
+        for language, services in languages.items():
+            wanted = content_selection.Selection().wants_language(language)
+            if wanted and resolvers.candidates(services) and language not in m3u8_data.get(title, {}):
+                failed_titles.add(title)
+    save_state(anime_url, merge_state(old_data, new_data, delta, failed_titles))
+    metrics.export('sync')
+    return delta
+
+if __name__ == "__main__":
+    # Example usage: python sync.py /anime/stream/one-piece [/anime/stream/...]
+    for url in sys.argv[1:] or ['/anime/stream/one-piece']:
+        sync_anime(url, debug=True)
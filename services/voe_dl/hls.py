@@ -0,0 +1,323 @@
+import os
+import re
+import sys
+import json
+import hashlib
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+import httpx
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Share the HTTP transport with the scrapers in /scripts
+SCRIPTS_DIR = os.path.join(BASE_DIR, 'scripts')
+if SCRIPTS_DIR not in sys.path:
+    sys.path.append(SCRIPTS_DIR)
+
+import http_client
+
+MAX_PARALLEL_SEGMENTS = 8  # Segments in flight per episode
+SEGMENT_RETRIES = 4  # Attempts per segment before the episode fails
+EXPIRED_STATUS_CODES = (403, 410)  # Signed URL expired or revoked; retrying the same URL is pointless
+
+# Variant policy for master playlists, used by both download engines (0: no limit)
+MAX_HEIGHT = int(os.environ.get('ANI_TOOL_MAX_HEIGHT', '0'))                            # e.g. 720
+MAX_BANDWIDTH = float(os.environ.get('ANI_TOOL_MAX_MBPS', '0')) * 1_000_000           # Bits per second
+BYTE_BUDGET = float(os.environ.get('ANI_TOOL_MAX_EPISODE_MB', '0')) * 1_000_000       # Bytes per episode
+
+ATTRIBUTE_PATTERN = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+
+class HlsError(Exception):
+    """Raised when a playlist or segment cannot be downloaded."""
+
+class HlsExpired(HlsError):
+    """Raised when the CDN answers 403/410, i.e. the signed m3u8 URL is no longer valid."""
+
+class HlsUnsupported(HlsError):
+    """Raised for playlists the native engine cannot handle (e.g. encrypted ones); use ffmpeg instead."""
+
+def parse_attributes(attribute_list):
+    """Parse an HLS attribute list (KEY=VALUE,KEY="VALUE") into a dict."""
+    return {key: value.strip('"') for key, value in ATTRIBUTE_PATTERN.findall(attribute_list)}
+
+def parse_playlist(text, playlist_url):
+    """Parse a master or media playlist.
+
+    Master playlists return {'variants': [...], 'renditions': [...]} with url/bandwidth/resolution
+    and audio group per variant and the #EXT-X-MEDIA renditions, media playlists return
+    {'segments': [...], 'init': ..., 'encrypted': ...}.
+    """
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if not lines or not lines[0].startswith('#EXTM3U'):
+        raise HlsError(f"Not an m3u8 playlist: {playlist_url}")
+
+    variants = []
+    renditions = []
+    segments = []
+    init = None
+    encrypted = False
+    pending_variant = None
+    duration = None
+    byte_range = None
+    next_offset = {}
+
+    for line in lines[1:]:
+        if line.startswith('#EXT-X-STREAM-INF:'):
+            attributes = parse_attributes(line.split(':', 1)[1])
+            width, height = 0, 0
+            if 'x' in attributes.get('RESOLUTION', ''):
+                width, height = (int(value) for value in attributes['RESOLUTION'].split('x'))
+            pending_variant = {
+                'bandwidth': int(attributes.get('BANDWIDTH', 0) or 0),
+                'width': width,
+                'height': height,
+                'codecs': attributes.get('CODECS', ''),
+                'audio': attributes.get('AUDIO'),  # Group of the separate audio renditions, if any
+            }
+        elif line.startswith('#EXT-X-MEDIA:'):
+            attributes = parse_attributes(line.split(':', 1)[1])
+            renditions.append({
+                'type': attributes.get('TYPE', ''),
+                'group': attributes.get('GROUP-ID'),
+                'name': attributes.get('NAME', ''),
+                'default': attributes.get('DEFAULT') == 'YES',
+                'url': urljoin(playlist_url, attributes['URI']) if 'URI' in attributes else None,
+            })
+        elif line.startswith('#EXTINF:'):
+            duration = float(line.split(':', 1)[1].split(',')[0] or 0)
+        elif line.startswith('#EXT-X-BYTERANGE:'):
+            byte_range = line.split(':', 1)[1]
+        elif line.startswith('#EXT-X-MAP:'):
+            attributes = parse_attributes(line.split(':', 1)[1])
+            init = {'url': urljoin(playlist_url, attributes['URI']), 'range': None}
+            if 'BYTERANGE' in attributes:
+                length, _, offset = attributes['BYTERANGE'].partition('@')
+                init['range'] = (int(offset or 0), int(length))
+        elif line.startswith('#EXT-X-KEY:'):
+            method = parse_attributes(line.split(':', 1)[1]).get('METHOD', 'NONE')
+            if method != 'NONE':
+                encrypted = True
+        elif line.startswith('#'):
+            continue
+        elif pending_variant is not None:
+            pending_variant['url'] = urljoin(playlist_url, line)
+            variants.append(pending_variant)
+            pending_variant = None
+        else:
+            segment_url = urljoin(playlist_url, line)
+            segment = {'url': segment_url, 'duration': duration or 0.0, 'range': None}
+            if byte_range:
+                length, _, offset = byte_range.partition('@')
+                start = int(offset) if offset else next_offset.get(segment_url, 0)
+                segment['range'] = (start, int(length))
+                next_offset[segment_url] = start + int(length)
+            segments.append(segment)
+            duration = None
+            byte_range = None
+
+    if variants:
+        return {'variants': variants, 'renditions': renditions}
+    return {'segments': segments, 'init': init, 'encrypted': encrypted}
+
+def fetch_playlist(playlist_url):
+    """Download and parse a playlist, returning (final_url, parsed)."""
+    try:
+        response = http_client.get(playlist_url)
+        response.raise_for_status()
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code in EXPIRED_STATUS_CODES:
+            raise HlsExpired(f"Playlist URL rejected ({e.response.status_code}): {playlist_url}")
+        raise HlsError(f"Failed to fetch playlist {playlist_url}: {e}")
+    except httpx.HTTPError as e:
+        raise HlsError(f"Failed to fetch playlist {playlist_url}: {e}")
+    final_url = str(response.url)
+    return final_url, parse_playlist(response.text, final_url)
+
+def estimate_size(playlist, bandwidth=0):
+    """Estimated bytes of a media playlist: exact for byte ranges, else duration x bandwidth (None if unknown)."""
+    segments = playlist['segments']
+    if segments and all(segment['range'] for segment in segments):
+        return sum(segment['range'][1] for segment in segments)
+    if not bandwidth:
+        return None
+    return int(sum(segment['duration'] for segment in segments) * bandwidth / 8)
+
+def rank_variants(variants, max_height=None, max_bandwidth=None):
+    """The variants within the height and bandwidth caps, best first (only the smallest one if none fits)."""
+    max_height = MAX_HEIGHT if max_height is None else max_height
+    max_bandwidth = MAX_BANDWIDTH if max_bandwidth is None else max_bandwidth
+    # Variants that do not state a resolution or bandwidth are not held against that cap
+    allowed = [
+        variant for variant in variants
+        if (not max_height or not variant['height'] or variant['height'] <= max_height)
+        and (not max_bandwidth or not variant['bandwidth'] or variant['bandwidth'] <= max_bandwidth)
+    ]
+    if not allowed:
+        allowed = [min(variants, key=lambda variant: (variant['bandwidth'], variant['height']))]
+    return sorted(allowed, key=lambda variant: (variant['bandwidth'], variant['height']), reverse=True)
+
+def audio_rendition(renditions, group):
+    """URL of the audio playlist a variant's AUDIO group points to (the default one first), or None.
+
+    None also when the group's renditions have no URI, i.e. the audio is muxed into the variant.
+    """
+    if not group:
+        return None
+    candidates = [rendition for rendition in renditions
+                  if rendition['type'] == 'AUDIO' and rendition['group'] == group and rendition['url']]
+    candidates.sort(key=lambda rendition: not rendition['default'])
+    return candidates[0]['url'] if candidates else None
+
+def load_media_playlist(m3u8_url, max_height=None, max_bandwidth=None, byte_budget=None):
+    """Return the media playlist behind an m3u8 URL, picking the variant of a master playlist by policy.
+
+    The best variant within MAX_HEIGHT and MAX_BANDWIDTH is used, or the best one whose
+    estimated size stays within BYTE_BUDGET. The result also holds 'url' (of the media
+    playlist), 'audio_url' (of a separate audio rendition, else None), 'variant' (None
+    for a media playlist URL) and 'estimated_size' in bytes.
+    """
+    byte_budget = BYTE_BUDGET if byte_budget is None else byte_budget
+    playlist_url, playlist = fetch_playlist(m3u8_url)
+    variant = None
+    audio_url = None
+    if 'variants' in playlist:
+        renditions = playlist['renditions']
+        ranked = rank_variants(playlist['variants'], max_height, max_bandwidth)
+        variant = ranked[0]
+        playlist_url, playlist = fetch_playlist(variant['url'])
+        if 'variants' in playlist:
+            raise HlsUnsupported(f"Nested master playlists are not supported: {m3u8_url}")
+
+        estimate = estimate_size(playlist, variant['bandwidth'])
+        if byte_budget and estimate and estimate > byte_budget and len(ranked) > 1:
+            # Every variant covers the same duration, so the others are estimated without fetching them
+            duration = sum(segment['duration'] for segment in playlist['segments'])
+            smaller = [other for other in ranked[1:] if other['bandwidth'] * duration / 8 <= byte_budget]
+            variant = smaller[0] if smaller else ranked[-1]
+            playlist_url, playlist = fetch_playlist(variant['url'])
+            if 'variants' in playlist:
+                raise HlsUnsupported(f"Nested master playlists are not supported: {m3u8_url}")
+
+        audio_url = audio_rendition(renditions, variant['audio'])
+
+    playlist['url'] = playlist_url
+    playlist['audio_url'] = audio_url
+    playlist['variant'] = variant
+    playlist['estimated_size'] = estimate_size(playlist, variant['bandwidth'] if variant else 0)
+    return playlist
+
+def describe_playlist(playlist):
+    """Short description of the chosen variant and size, e.g. '720p, 2.4 Mbps, ~412 MB'."""
+    parts = []
+    variant = playlist.get('variant')
+    if variant and variant['height']:
+        parts.append(f"{variant['height']}p")
+    if variant and variant['bandwidth']:
+        parts.append(f"{variant['bandwidth'] / 1_000_000:.1f} Mbps")
+    if playlist.get('estimated_size'):
+        parts.append(f"~{playlist['estimated_size'] / 1_000_000:.0f} MB")
+    parts.append(f"{len(playlist['segments'])} segments")
+    return ', '.join(parts)
+
+def fetch_segment(segment, retries=SEGMENT_RETRIES):
+    """Download one segment (or init section) with retries and return its bytes."""
+    headers = {}
+    if segment.get('range'):
+        start, length = segment['range']
+        headers['Range'] = f"bytes={start}-{start + length - 1}"
+
+    # Network errors, 429 and 5xx are retried with backoff by the request policy
+    try:
+        response = http_client.get(segment['url'], attempts=retries, headers=headers)
+    except httpx.HTTPError as e:
+        raise HlsError(f"Segment failed after {retries} attempts: {segment['url']}: {e}")
+    if response.status_code in EXPIRED_STATUS_CODES:
+        raise HlsExpired(f"Segment URL rejected ({response.status_code}): {segment['url']}")
+    if response.is_error:
+        raise HlsError(f"Segment failed ({response.status_code}): {segment['url']}")
+    return response.content
+
+def playlist_fingerprint(playlist):
+    """Identify a playlist by its segment layout; signed segment URLs change, the layout does not."""
+    layout = [(segment['duration'], segment['range']) for segment in playlist['segments']]
+    paths = [segment['url'].split('?')[0].rsplit('/', 1)[-1] for segment in playlist['segments']]
+    return hashlib.sha256(json.dumps([layout, paths]).encode('utf-8')).hexdigest()
+
+def load_progress(output_file, fingerprint):
+    """Return (segments_written, bytes_written) of an interrupted download of the same playlist."""
+    try:
+        with open(f"{output_file}.json", 'r', encoding='utf-8') as progress_file:
+            progress = json.load(progress_file)
+        if progress['fingerprint'] == fingerprint and os.path.getsize(output_file) >= progress['offset']:
+            return progress['written'], progress['offset']
+    except (OSError, ValueError, KeyError):
+        pass
+    return 0, 0
+
+def save_progress(output_file, fingerprint, written, offset):
+    """Checkpoint how many segments (and bytes) of output_file are complete."""
+    tmp_path = f"{output_file}.json.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as progress_file:
+        json.dump({'fingerprint': fingerprint, 'written': written, 'offset': offset}, progress_file)
+    os.replace(tmp_path, f"{output_file}.json")
+
+def download_segments(playlist, output_file, max_parallel=MAX_PARALLEL_SEGMENTS, retries=SEGMENT_RETRIES):
+    """Fetch all segments with a bounded window of parallel requests and append them in order to output_file.
+
+    Progress is checkpointed after every segment, so a rerun continues after the last complete one.
+    """
+    segments = playlist['segments']
+    fingerprint = playlist_fingerprint(playlist)
+    written, offset = load_progress(output_file, fingerprint)
+    if written:
+        print(f"Resuming {os.path.basename(output_file)} at segment {written + 1}/{len(segments)}")
+
+    with open(output_file, 'r+b' if written else 'wb') as output, ThreadPoolExecutor(max_workers=max_parallel) as executor:
+        output.truncate(offset)
+        output.seek(offset)
+        if not written and playlist['init']:
+            output.write(fetch_segment(playlist['init'], retries))
+
+        # Keep at most max_parallel segments ahead of the next one to write
+        pending = {}
+        next_to_submit = written
+        for next_to_write in range(written, len(segments)):
+            while next_to_submit < len(segments) and next_to_submit < next_to_write + max_parallel:
+                pending[next_to_submit] = executor.submit(fetch_segment, segments[next_to_submit], retries)
+                next_to_submit += 1
+            output.write(pending.pop(next_to_write).result())
+            output.flush()
+            save_progress(output_file, fingerprint, next_to_write + 1, output.tell())
+
+def remux_to_mp4(input_file, output_file, adts_audio=True):
+    """Use ffmpeg only to remux the downloaded stream into an MP4 container."""
+    command = ['ffmpeg', '-nostdin', '-loglevel', 'error', '-y', '-i', input_file, '-c', 'copy']
+    if adts_audio:
+        command += ['-bsf:a', 'aac_adtstoasc']  # Required for proper audio stream handling of TS input
+    partial_file = f"{output_file}.part"
+    command += ['-f', 'mp4', partial_file]
+    subprocess.run(command, check=True)
+    os.replace(partial_file, output_file)  # Only a finished remux ever gets the final name
+
+def download_hls(m3u8_url, output_file, max_parallel=MAX_PARALLEL_SEGMENTS, retries=SEGMENT_RETRIES):
+    """Download an HLS stream natively, remux it to output_file and return the playlist duration."""
+    playlist = load_media_playlist(m3u8_url)
+    print(f"{os.path.basename(output_file)}: {describe_playlist(playlist)}")
+    if playlist['encrypted']:
+        raise HlsUnsupported(f"Encrypted playlists are not supported: {m3u8_url}")
+    if playlist['audio_url']:
+        raise HlsUnsupported(f"Separate audio renditions are not supported: {m3u8_url}")
+    if not playlist['segments']:
+        raise HlsError(f"Playlist has no segments: {m3u8_url}")
+
+    fragmented = playlist['init'] is not None
+    temp_file = f"{output_file}.{'m4s' if fragmented else 'ts'}.part"
+    download_segments(playlist, temp_file, max_parallel=max_parallel, retries=retries)
+    remux_to_mp4(temp_file, output_file, adts_audio=not fragmented)
+
+    # Keep the segment file on failure so the next run can resume it, drop it once remuxed
+    for path in (temp_file, f"{temp_file}.json"):
+        if os.path.exists(path):
+            os.remove(path)
+    return sum(segment['duration'] for segment in playlist['segments'])
@@ -0,0 +1,92 @@
+import os
+import json
+import time
+import shutil
+import threading
+import subprocess
+
+MANIFEST_NAME = 'manifest.json'
+
+_path_locks = {}  # One lock per manifest file, shared by every DownloadManifest of this process
+_path_locks_lock = threading.Lock()
+
+def probe_duration(file_path):
+    """Return the media duration in seconds using ffprobe, or None if it is not available."""
+    if shutil.which('ffprobe') is None:
+        return None
+    try:
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1', file_path],
+            capture_output=True, text=True, check=True,
+        )
+        return float(result.stdout.strip())
+    except (subprocess.CalledProcessError, ValueError):
+        return None
+
+def _lock_for(path):
+    with _path_locks_lock:
+        return _path_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+class DownloadManifest:
+    """Per-anime record of finished downloads (size, duration, source URL), stored next to the files.
+
+    Several instances may track the same folder (e.g. two queue jobs for one series): every
+    change re-reads the file and is merged into it under a lock shared per manifest file.
+    """
+
+    def __init__(self, anime_dir):
+        self.anime_dir = anime_dir
+        self.path = os.path.join(anime_dir, MANIFEST_NAME)
+        self.lock = _lock_for(self.path)
+        self.entries = self._read()
+
+    def _key(self, output_path):
+        return os.path.relpath(output_path, self.anime_dir).replace(os.sep, '/')
+
+    def _read(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as manifest_file:
+                return json.load(manifest_file).get('files', {})
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        # Called with self.lock held, after applying the change to a fresh self._read()
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as manifest_file:
+            json.dump({'files': self.entries}, manifest_file, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, self.path)
+
+    def is_complete(self, output_path):
+        """True if the file was recorded as finished and is still on disk with the recorded size."""
+        with self.lock:
+            entry = self.entries.get(self._key(output_path))
+        if entry is None:
+            return False
+        try:
+            return os.path.getsize(output_path) == entry['size']
+        except OSError:
+            return False
+
+    def record(self, output_path, source_url, duration=None):
+        """Record a finished download; returns its manifest entry."""
+        if duration is None:
+            duration = probe_duration(output_path)
+        entry = {
+            'size': os.path.getsize(output_path),
+            'duration': duration,
+            'source_url': source_url,
+            'completed_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        with self.lock:
+            self.entries = self._read()
+            self.entries[self._key(output_path)] = entry
+            self._save()
+        return entry
+
+    def remove(self, output_path):
+        """Forget a download, e.g. when it has to be fetched again."""
+        with self.lock:
+            self.entries = self._read()
+            if self.entries.pop(self._key(output_path), None) is not None:
+                self._save()
@@ -0,0 +1,81 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# Hoster name (lowercase) -> function(stream_url, retries, debug) returning an m3u8 URL or None.
+# voe_extract registers VOE; other hosters plug in the same way.
+RESOLVERS = {}
+
+RACE_WORKERS = 16  # Resolver calls running at once across all races
+HEDGE_DELAY = 0.0  # Seconds to wait for a candidate before starting the next one (0: start all at once)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def register(hoster, resolve):
+    """Register the resolver of a hoster; service names containing the hoster name use it."""
+    RESOLVERS[hoster.lower()] = resolve
+
+def resolver_for(service_name):
+    """Return (hoster, resolver) for an extracted service name, or (None, None) if no resolver handles it."""
+    name = service_name.lower()
+    for hoster, resolve in RESOLVERS.items():
+        if hoster in name:
+            return hoster, resolve
+    return None, None
+
+def candidates(services):
+    """The services of one language that a registered resolver can handle, in page order."""
+    return [service for service in services if resolver_for(service['service_name'])[1] is not None]
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=RACE_WORKERS, thread_name_prefix='resolver')
+        return _executor
+
+def _attempt(service, retries, debug):
+    _, resolve = resolver_for(service['service_name'])
+    try:
+        return resolve(service['stream_url'], retries=retries, debug=debug)
+    except Exception as e:
+        print(f"Resolver for {service['service_name']} failed on {service['stream_url']}: {e}")
+        return None
+
+def resolve_stream(services, retries=3, debug=False, hedge_delay=HEDGE_DELAY):
+    """Race the resolvers of the given services and return the first m3u8 URL any of them finds.
+
+    With hedge_delay > 0 the candidates are started one after another, each only if the
+    previous ones have not answered within hedge_delay seconds. Losing resolvers are left
+    to finish in the background; their results are ignored.
+    """
+    services = candidates(services)
+    if not services:
+        return None
+    if len(services) == 1:
+        return _attempt(services[0], retries, debug)
+
+    executor = _get_executor()
+    pending = set()
+    remaining = list(services)
+    while remaining or pending:
+        if remaining:
+            service = remaining.pop(0)
+            pending.add(executor.submit(_attempt, service, retries, debug))
+            if remaining and hedge_delay == 0:
+                continue
+        done, pending = wait(pending, timeout=hedge_delay if remaining else None, return_when=FIRST_COMPLETED)
+        for future in done:
+            m3u8_url = future.result()
+            if m3u8_url:
+                for loser in pending:
+                    loser.cancel()  # Drops the ones that have not started yet
+                return m3u8_url
+    return None
+
+def refresh_stream(source_url, hoster=None):
+    """Resolve a hoster link again, e.g. for an expired m3u8 URL (see url_cache.refresh)."""
+    resolve = RESOLVERS.get((hoster or 'voe').lower())
+    if resolve is None:
+        return None
+    return resolve(source_url)
@@ -0,0 +1,121 @@
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+from urllib.parse import urlparse, parse_qs
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Share the data folder with the scripts in /scripts
+SCRIPTS_DIR = os.path.join(BASE_DIR, 'scripts')
+if SCRIPTS_DIR not in sys.path:
+    sys.path.append(SCRIPTS_DIR)
+
+import config
+
+CACHE_DIR = os.path.join(config.DATA_DIR, 'url_cache')
+CACHE_PATH = os.path.join(CACHE_DIR, 'm3u8_urls.json')
+
+DEFAULT_MAX_AGE = 4 * 60 * 60  # Assumed lifetime of a signed URL without a readable expiry
+EXPIRY_MARGIN = 10 * 60  # Re-resolve URLs that expire within this many seconds
+SAVE_INTERVAL = 10  # Seconds between writes of the cache file; the rest is written at exit
+
+_lock = threading.Lock()
+_entries = None
+_dirty = False
+_saved_at = 0.0
+
+def parse_expiry(m3u8_url, resolved_at):
+    """Read the expiry time (epoch seconds) from a signed URL's query string, if it has one."""
+    query = parse_qs(urlparse(m3u8_url).query)
+
+    def number(name):
+        try:
+            return int(query[name][0])
+        except (KeyError, ValueError):
+            return None
+
+    for name in ('expires', 'Expires', 'exp', 'expiry'):
+        if number(name):
+            return number(name)
+
+    # VOE style: s = signing time, e = lifetime in seconds (or an absolute timestamp)
+    lifetime = number('e')
+    if lifetime:
+        if lifetime > 1_000_000_000:
+            return lifetime
+        return (number('s') or int(resolved_at)) + lifetime
+    return None
+
+def _load():
+    global _entries
+    if _entries is None:
+        try:
+            with open(CACHE_PATH, 'r', encoding='utf-8') as cache_file:
+                _entries = json.load(cache_file)
+        except (OSError, ValueError):
+            _entries = {}
+    return _entries
+
+def _save(force=False):
+    # Called with _lock held; writes at most every SAVE_INTERVAL seconds unless forced
+    global _dirty, _saved_at
+    now = time.time()
+    if not _dirty or (not force and now - _saved_at < SAVE_INTERVAL):
+        return
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # Drop entries that expired long ago, they can only be re-resolved from scratch anyway
+    live = {url: entry for url, entry in _entries.items() if entry['expires_at'] > now - 24 * 60 * 60}
+    tmp_path = f"{CACHE_PATH}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as cache_file:
+        json.dump(live, cache_file, ensure_ascii=False)
+    os.replace(tmp_path, CACHE_PATH)
+    _dirty = False
+    _saved_at = now
+
+def flush():
+    """Write pending cache entries now (also done at exit)."""
+    with _lock:
+        if _entries is not None:
+            _save(force=True)
+
+atexit.register(flush)
+
+def record(m3u8_url, source_url, hoster=None):
+    """Remember which hoster link an m3u8 URL was resolved from, and when it expires."""
+    global _dirty
+    resolved_at = time.time()
+    expires_at = parse_expiry(m3u8_url, resolved_at) or resolved_at + DEFAULT_MAX_AGE
+    with _lock:
+        _load()[m3u8_url] = {'source_url': source_url, 'hoster': hoster, 'resolved_at': resolved_at, 'expires_at': expires_at}
+        _dirty = True
+        _save()
+
+def lookup(m3u8_url):
+    """Return the cache entry of an m3u8 URL, or None."""
+    with _lock:
+        return _load().get(m3u8_url)
+
+def is_expiring(m3u8_url, margin=EXPIRY_MARGIN):
+    """True if the URL is known and expires within margin seconds."""
+    entry = lookup(m3u8_url)
+    return entry is not None and entry['expires_at'] - time.time() < margin
+
+def refresh(m3u8_url, resolve):
+    """Re-resolve an m3u8 URL with resolve(source_url, hoster); returns the new URL or None.
+
+    The resolvers record the URLs they find themselves (see voe_extract.fetch_m3u8_url).
+    """
+    entry = lookup(m3u8_url)
+    if entry is None:
+        return None
+    return resolve(entry['source_url'], entry.get('hoster'))
+
+def fresh_url(m3u8_url, resolve, margin=EXPIRY_MARGIN):
+    """Return m3u8_url, or a just-in-time re-resolved one if it is about to expire."""
+    if not is_expiring(m3u8_url, margin):
+        return m3u8_url
+    print(f"m3u8 URL expires soon, resolving it again: {m3u8_url}")
+    return refresh(m3u8_url, resolve) or m3u8_url
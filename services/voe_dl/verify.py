@@ -0,0 +1,107 @@
+import os
+import sys
+import json
+import shutil
+import threading
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Share the library with the scripts in /scripts
+SCRIPTS_DIR = os.path.join(BASE_DIR, 'scripts')
+if SCRIPTS_DIR not in sys.path:
+    sys.path.append(SCRIPTS_DIR)
+
+import library
+from manifest import DownloadManifest
+
+VERIFY_WORKERS = min(4, os.cpu_count() or 1)  # ffprobe checks running at once
+DURATION_TOLERANCE = 2.0  # Seconds (or 1% of the playlist duration, whichever is larger)
+REQUIRED_STREAMS = ('video', 'audio')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def verify_file(file_path, expected_duration=None):
+    """Check a downloaded file with ffprobe; returns (ok, reason, duration).
+
+    The container has to open without errors (e.g. a missing MP4 index), contain a video
+    and an audio stream and last as long as the playlist it was downloaded from.
+    Without ffprobe nothing is checked.
+    """
+    if shutil.which('ffprobe') is None:
+        return True, 'ffprobe not available, not verified', None
+    result = subprocess.run(
+        ['ffprobe', '-v', 'error', '-show_entries', 'format=duration:stream=codec_type', '-of', 'json', file_path],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0 or result.stderr.strip():
+        return False, f"ffprobe reported errors: {result.stderr.strip()[:300]}", None
+
+    try:
+        probe = json.loads(result.stdout)
+        duration = float(probe.get('format', {}).get('duration'))
+    except (TypeError, ValueError):
+        return False, 'no duration in the container', None
+
+    stream_types = {stream.get('codec_type') for stream in probe.get('streams', [])}
+    missing = [stream_type for stream_type in REQUIRED_STREAMS if stream_type not in stream_types]
+    if missing:
+        return False, f"no {' or '.join(missing)} stream", duration
+
+    if expected_duration:
+        tolerance = max(DURATION_TOLERANCE, expected_duration * 0.01)
+        if abs(duration - expected_duration) > tolerance:
+            return False, f"lasts {duration:.1f}s, the playlist {expected_duration:.1f}s", duration
+    return True, 'ok', duration
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Spawned, not forked: the downloader forks from a process full of threads
+            _executor = ProcessPoolExecutor(max_workers=VERIFY_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _executor
+
+def verify(file_path, expected_duration=None):
+    """Run verify_file in the shared process pool and wait for its (ok, reason, duration)."""
+    if shutil.which('ffprobe') is None:
+        return verify_file(file_path, expected_duration)  # Nothing to run, no pool needed
+    return _get_executor().submit(verify_file, file_path, expected_duration).result()
+
+def verify_anime_dir(anime_dir):
+    """Check every finished download of an anime folder at once; broken files are deleted and forgotten.
+
+    Forgotten files are no longer in the manifest or the library, so the next download or
+    sync of the series fetches them again. Returns the paths of the broken files.
+    """
+    anime_dir = os.path.abspath(anime_dir)  # The library records absolute paths
+    manifest = DownloadManifest(anime_dir)
+    paths = [os.path.join(anime_dir, *key.split('/')) for key in manifest.entries]
+    if shutil.which('ffprobe') is None:
+        print("ffprobe not found, nothing can be verified.")
+        return []
+
+    executor = _get_executor()
+    results = zip(paths, executor.map(verify_file, paths))  # No playlist at hand: container and streams only
+    broken = []
+    store = library.Library()
+    for path, (ok, reason, _) in results:
+        if ok:
+            continue
+        print(f"Broken: {os.path.relpath(path, anime_dir)} ({reason})")
+        broken.append(path)
+        if os.path.exists(path):
+            os.remove(path)
+        manifest.remove(path)
+        store.forget_download(path)
+    store.close()
+    print(f"Verified {len(paths)} files in {anime_dir}: {len(broken)} broken, queued for the next download.")
+    return broken
+
+if __name__ == "__main__":
+    # Example usage: python verify.py downloads/Death_Note [downloads/...]
+    for anime_dir in sys.argv[1:]:
+        verify_anime_dir(anime_dir)
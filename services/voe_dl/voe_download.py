@@ -1,132 +1,518 @@
 import os
-import json
+import sys
+import time
 import subprocess
 import shutil
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import hls
+import library
+import metrics
+import resolvers
+import selection as content_selection
+import url_cache
+import verify
+import voe_extract  # Registers the VOE resolver
+from manifest import DownloadManifest
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-DATA_DIR = os.path.join(BASE_DIR, 'data')
 DOWNLOADS_DIR = os.path.join(BASE_DIR, 'downloads')
 
-def convert_m3u8_to_mp4(m3u8_url, output_file):
-    """Uses ffmpeg to download an m3u8 URL and save it as an MP4 file."""
+# Download concurrency
+MAX_WORKERS = 3  # ffmpeg processes running at once
+MAX_PER_HOST = 2  # ffmpeg processes per CDN host
+RETRY_DELAY = 5  # Seconds before retrying a failed download (grows with each attempt)
+
+# ffmpeg transfers are killed and retried when they hang
+STALL_TIMEOUT = 60      # Seconds without any progress
+# Optional floor for slow transfers, in media seconds per second over SPEED_WINDOW (0: off, only hangs are caught)
+MIN_SPEED = float(os.environ.get('ANI_TOOL_MIN_SPEED', '0'))
+SPEED_WINDOW = 120      # Seconds
+PROGRESS_INTERVAL = 15  # Seconds between progress lines of one download
+
+# 'ffmpeg' lets one ffmpeg process fetch the whole stream, 'native' fetches segments in parallel (hls.py)
+DOWNLOAD_ENGINE = os.environ.get('ANI_TOOL_DOWNLOAD_ENGINE', 'ffmpeg')
+
+# Language folder names mapping
+LANGUAGE_FOLDERS = content_selection.LANGUAGE_FOLDERS
+
+class StreamExpired(Exception):
+    """Raised when the CDN rejects an m3u8 URL with 403/410; it has to be resolved again."""
+
+class DownloadStalled(Exception):
+    """Raised when an ffmpeg transfer made no progress, or too little, and was killed."""
+
+class TransferBoard:
+    """Bytes written by the running ffmpeg transfers, for per-episode and aggregate throughput."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.transfers = {}  # label -> (start time, bytes written so far)
+
+    def update(self, label, started, total_size):
+        with self.lock:
+            self.transfers[label] = (started, total_size)
+
+    def finish(self, label):
+        with self.lock:
+            self.transfers.pop(label, None)
+
+    def rates(self, label):
+        """(bytes per second of label, bytes per second of all running transfers)."""
+        now = time.monotonic()
+        with self.lock:
+            rates = {name: size / max(now - started, 1e-6) for name, (started, size) in self.transfers.items()}
+        return rates.get(label, 0.0), sum(rates.values())
+
+transfers = TransferBoard()
+
+def parse_progress(block):
+    """Turn one block of ffmpeg -progress output into (media seconds, bytes written, speed or None)."""
+    out_time = block.get('out_time_us', block.get('out_time_ms', 'N/A'))  # Both are microseconds
+    total_size = block.get('total_size', 'N/A')
+    speed = block.get('speed', 'N/A').rstrip('x').strip()
+    return (
+        int(out_time) / 1_000_000 if out_time.lstrip('-').isdigit() else None,
+        int(total_size) if total_size.isdigit() else None,
+        float(speed) if speed.replace('.', '', 1).isdigit() else None,
+    )
+
+def run_ffmpeg(command, label):
+    """Run an ffmpeg command that has '-progress pipe:1', reporting its progress and killing it when it stalls.
+
+    Raises DownloadStalled if nothing moved for STALL_TIMEOUT seconds (or, with MIN_SPEED set,
+    less than MIN_SPEED media seconds per second came in over SPEED_WINDOW), CalledProcessError
+    if ffmpeg failed.
+    """
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    started = time.monotonic()
+    state = {'out_time': 0.0, 'total_size': 0, 'speed': None, 'changed': started}
+    state_lock = threading.Lock()
+    stderr_lines = []
+
+    def read_progress():
+        block = {}
+        for line in process.stdout:
+            key, _, value = line.strip().partition('=')
+            block[key] = value
+            if key != 'progress':
+                continue
+            out_time, total_size, speed = parse_progress(block)
+            block = {}
+            with state_lock:
+                if (out_time or 0) > state['out_time'] or (total_size or 0) > state['total_size']:
+                    state['changed'] = time.monotonic()
+                state['out_time'] = max(state['out_time'], out_time or 0)
+                state['total_size'] = max(state['total_size'], total_size or 0)
+                state['speed'] = speed
+            transfers.update(label, started, state['total_size'])
+
+    readers = [
+        threading.Thread(target=read_progress, daemon=True),
+        threading.Thread(target=lambda: stderr_lines.extend(process.stderr), daemon=True),  # Keeps the pipe drained
+    ]
+    for reader in readers:
+        reader.start()
+
+    window = (started, 0.0)  # (time, media seconds) at the start of the current speed window
+    last_report = started
+    stalled = None
     try:
+        while True:
+            try:
+                process.wait(timeout=1)
+                break
+            except subprocess.TimeoutExpired:
+                pass
+            now = time.monotonic()
+            with state_lock:
+                out_time, total_size, speed, changed = state['out_time'], state['total_size'], state['speed'], state['changed']
+
+            if now - changed > STALL_TIMEOUT:
+                stalled = f"no progress for {STALL_TIMEOUT} seconds"
+            elif now - window[0] >= SPEED_WINDOW:
+                window_speed = (out_time - window[1]) / (now - window[0])
+                if MIN_SPEED and window_speed < MIN_SPEED:
+                    stalled = f"{window_speed:.2f}x over the last {SPEED_WINDOW} seconds (minimum {MIN_SPEED}x)"
+                window = (now, out_time)
+            if stalled:
+                process.kill()
+                process.wait()
+                break
+
+            if now - last_report >= PROGRESS_INTERVAL:
+                last_report = now
+                rate, total_rate = transfers.rates(label)
+                print(f"{label}: {total_size / 1e6:.1f} MB, {time.strftime('%H:%M:%S', time.gmtime(out_time))} done, "
+                      f"{rate / 1e6:.2f} MB/s" + (f" ({speed:.1f}x)" if speed else "") +
+                      f", all downloads {total_rate / 1e6:.2f} MB/s")
+    finally:
+        transfers.finish(label)
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        for reader in readers:
+            reader.join()
+
+    if stalled:
+        raise DownloadStalled(f"{label} stalled: {stalled}")
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command, stderr=''.join(stderr_lines))
+
+def convert_m3u8_to_mp4(m3u8_url, output_file, engine=None, label=None):
+    """Download an m3u8 URL and save it as an MP4 file.
+
+    Returns {'playlist_duration': seconds or None} on success and None on failure. Both engines write to a .part file first, so output_file only ever exists complete.
+    Raises StreamExpired if the signed URL is no longer accepted. A stalled ffmpeg
+    transfer is killed and counts as a failed attempt.
+    """
+    if (engine or DOWNLOAD_ENGINE) == 'native':
+        try:
+            playlist_duration = hls.download_hls(m3u8_url, output_file)
+            print(f"Conversion completed: {output_file}")
+            return {'playlist_duration': playlist_duration}
+        except hls.HlsExpired as e:
+            raise StreamExpired(str(e))
+        except hls.HlsUnsupported as e:
+            print(f"Native HLS download not possible, falling back to ffmpeg: {e}")
+        except (hls.HlsError, subprocess.CalledProcessError) as e:
+            print(f"Native HLS download failed: {e}")
+            return None
+
+    # Pick the variant here (hls.MAX_HEIGHT, MAX_BANDWIDTH, BYTE_BUDGET) instead of leaving it to ffmpeg
+    label = label or os.path.basename(output_file)
+    source_url = m3u8_url
+    audio_url = None
+    playlist_duration = None
+    try:
+        playlist = hls.load_media_playlist(m3u8_url)
+        source_url = playlist['url']
+        audio_url = playlist['audio_url']
+        playlist_duration = sum(segment['duration'] for segment in playlist['segments'])
+        print(f"{label}: {hls.describe_playlist(playlist)}")
+    except hls.HlsExpired as e:
+        raise StreamExpired(str(e))
+    except hls.HlsError as e:
+        print(f"Could not read the playlist of {label}, ffmpeg picks the variant: {e}")
+
+    partial_file = f"{output_file}.part"
+    try:
+        inputs = ['-i', source_url]  # Media playlist of the chosen variant
+        if audio_url:
+            # The variant's audio is a separate #EXT-X-MEDIA rendition: video from the first input, audio from the second
+            inputs += ['-i', audio_url, '-map', '0:v:0', '-map', '1:a:0']
         command = [
             'ffmpeg',
-            '-i', m3u8_url,   # Input m3u8 URL
+            '-nostdin',        # Never wait for keyboard input (several run at once)
+            '-loglevel', 'error',
+            '-y',              # Overwrite what a failed attempt left behind
+            '-nostats',
+            '-progress', 'pipe:1',  # key=value progress blocks on stdout, read by run_ffmpeg()
+            *inputs,
             '-c', 'copy',      # Copy codec (no re-encoding)
             '-bsf:a', 'aac_adtstoasc',  # Required for proper audio stream handling
-            output_file        # Output file
+            '-f', 'mp4',
+            partial_file       # Output file, renamed once ffmpeg has finished
         ]
-        
+
         # Run the ffmpeg command
-        subprocess.run(command, check=True)
+        run_ffmpeg(command, label)
+        os.replace(partial_file, output_file)
         print(f"Conversion completed: {output_file}")
+        return {'playlist_duration': playlist_duration}
     except subprocess.CalledProcessError as e:
-        print(f"ffmpeg failed with error: {e}")
+        print(f"ffmpeg failed with error: {e}\n{(e.stderr or '').strip()}")
+        if any(marker in (e.stderr or '') for marker in ('403 Forbidden', '410 Gone', 'HTTP error 403', 'HTTP error 410')):
+            raise StreamExpired(f"m3u8 URL rejected by the CDN: {m3u8_url}")
+        return None
+    except DownloadStalled as e:
+        print(f"{e}; killed ffmpeg")
+        return None
 
-def download_anime_content(m3u8_json_file, anime_data_file, retries=3, debug=False):
-    """Download anime movies and episodes in the correct structure."""
-    # Load m3u8 links from the json file
-    m3u8_json_path = os.path.join(DATA_DIR, m3u8_json_file)
-    anime_data_path = os.path.join(DATA_DIR, anime_data_file)
+_host_limits = {}  # CDN host -> semaphore, created with the cap of the first scheduler using the host
+_host_limits_lock = threading.Lock()
 
-    try:
-        # Load m3u8 data
-        with open(m3u8_json_path, 'r', encoding='utf-8') as m3u8_file:
-            m3u8_data = json.load(m3u8_file)
-
-        # Load anime name and episode titles from data.json
-        with open(anime_data_path, 'r', encoding='utf-8') as anime_data_file:
-            anime_data = json.load(anime_data_file)
-
-        anime_name = anime_data['anime_name']
-
-        # Create main download folder for the anime
-        anime_dir = os.path.join(DOWNLOADS_DIR, anime_name)
-        os.makedirs(anime_dir, exist_ok=True)
-
-        # Language folder names mapping
-        language_folders = {
-            'deutsch': 'german',
-            'mit-untertitel-deutsch': 'german_sub',
-            'english_sub': 'english_sub'  # If there's any entry for english_sub
-        }
-
-        # Prepare language directories with seasons and movies subdirectories
-        for lang in language_folders.values():
-            lang_dir = os.path.join(anime_dir, lang)
-            os.makedirs(os.path.join(lang_dir, 'seasons'), exist_ok=True)
-            os.makedirs(os.path.join(lang_dir, 'movies'), exist_ok=True)
-
-        # Track episode download status
-        total_episodes = 0
-        downloaded_episodes = 0
-
-        # Process m3u8 links and download content
-        for episode_name, languages in m3u8_data.items():
-            if debug:
-                print(f"Processing episode: {episode_name}")
-
-            for language, m3u8_url in languages.items():
-                if language in language_folders:
-                    total_episodes += 1
-
-                    # Get the episode title from data.json or movies section
-                    episode_title = ""
-                    if "S0E" in episode_name:
-                        # Movies go into the movies folder
-                        movie_number = int(episode_name.split('-')[0][3:])  # Extract movie number from S0E1 format
-                        movie_data = next((movie for movie in anime_data['movies']['movie_list'] if movie['movie_number'] == movie_number), None)
-                        if movie_data:
-                            episode_title = movie_data['movie_name']
-                        output_subdir = 'movies'
-                    else:
-                        # Episodes go into the seasons folder directly (no subfolder per episode)
-                        season_num = episode_name.split(' ')[0][1:]  # Extract season number
-                        episode_data = anime_data.get('seasons', {}).get(f'Season {season_num}', {}).get('episodes', {}).get(episode_name, {})
-                        episode_title = episode_data.get('episode_title', episode_name)
-                        output_subdir = 'seasons'  # All episodes go here
-
-                    # Ensure the episode title is formatted correctly for filenames
-                    episode_title = episode_title.replace(' ', '_') if episode_title.strip() else 'unknown_episode'
-
-                    # Prevent double appending of episode titles
-                    episode_filename = f"{episode_name}_{episode_title}.mp4" if episode_title != episode_name.split(' - ')[1].strip() else f"{episode_name}.mp4"
-
-                    # Path to save the episode in the correct language folder (directly in seasons/movies, no additional episode subfolder)
-                    output_path = os.path.join(anime_dir, language_folders[language], output_subdir, episode_filename)
-                    os.makedirs(os.path.dirname(output_path), exist_ok=True)  # Ensure the subdirectory exists
-
-                    if debug:
-                        print(f"Downloading {episode_name} ({language}) to {output_path}")
-                        print(f"m3u8 URL: {m3u8_url}")
-
-                    # Check if the m3u8 URL is valid
-                    if not m3u8_url:
-                        print(f"No m3u8 URL found for {episode_name} ({language})")
+class DownloadScheduler:
+    """Runs ffmpeg downloads on a worker pool, capped per CDN host, with retries and shared progress."""
+
+    def __init__(self, max_workers=MAX_WORKERS, max_per_host=MAX_PER_HOST, retries=3, debug=False, engine=None,
+                 limiter=None, owner=None):
+        self.max_per_host = max_per_host
+        self.limiter = limiter  # Optional limiter shared with other schedulers (see job_queue.FairLimiter)
+        self.owner = owner
+        self.engine = engine
+        self.retries = retries
+        self.debug = debug
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.lock = threading.Lock()
+        self.futures = []
+        self.total = 0
+        self.downloaded = 0
+        self.failed = 0
+        self.failed_keys = set()  # Caller-chosen keys (e.g. episode names) of failed downloads
+
+    def _host_limit(self, m3u8_url):
+        # Shared by every scheduler of the process, so concurrent jobs do not multiply the cap
+        host = urlparse(m3u8_url).netloc
+        with _host_limits_lock:
+            return _host_limits.setdefault(host, threading.Semaphore(self.max_per_host))
+
+    def _global_slot(self):
+        return self.limiter.slot(self.owner) if self.limiter else nullcontext()
+
+    def _report(self, label, key, success):
+        with self.lock:
+            if success:
+                self.downloaded += 1
+            else:
+                self.failed += 1
+                self.failed_keys.add(key)
+            done = self.downloaded + self.failed
+            print(f"[{done}/{self.total}] {'Downloaded' if success else 'Failed'}: {label} "
+                  f"({self.downloaded} ok, {self.failed} failed)")
+
+    def _download(self, label, key, m3u8_url, output_path, manifest, on_success):
+        success = False
+        try:
+            for attempt in range(1, max(self.retries, 1) + 1):
+                expired = False
+                try:
+                    # Signed URLs may have expired while the job was queued; resolve again just in time
+                    m3u8_url = url_cache.fresh_url(m3u8_url, resolvers.refresh_stream)
+                    # Host cap first: a job waiting for its CDN host must not hold a global slot
+                    with self._host_limit(m3u8_url), self._global_slot(), metrics.stage('download'):
+                        if self.debug:
+                            print(f"Downloading {label} (attempt {attempt}/{self.retries}) to {output_path}")
+                        started = time.time()
+                        try:
+                            result = convert_m3u8_to_mp4(m3u8_url, output_path, self.engine, label)
+                        except StreamExpired as e:
+                            print(f"{e}; resolving {label} again")
+                            result, expired = None, True
+                    success = result is not None
+                    if success:
+                        metrics.record_download(label, os.path.getsize(output_path), time.time() - started)
+                        # Outside the download slots: the next transfer starts while this file is checked
+                        with metrics.stage('verify'):
+                            success, reason, duration = verify.verify(output_path, result['playlist_duration'])
+                        if not success:
+                            print(f"Verification of {label} failed: {reason}")
+                            metrics.count_failure('verify')
+                            os.remove(output_path)
+                            if manifest is not None:
+                                manifest.remove(output_path)
+                    if success:
+                        entry = manifest.record(output_path, m3u8_url, duration) if manifest is not None else {}
+                        if on_success is not None:
+                            on_success(output_path, m3u8_url, entry.get('duration', duration))
+                        break
+                except Exception as e:
+                    # E.g. ffmpeg missing, a full disk or a library error: a failed attempt like any other
+                    print(f"Attempt {attempt} for {label} failed: {e!r}")
+                    success = False
+                if expired:
+                    # Only this entry is re-resolved; retry right away with the new URL
+                    new_url = url_cache.refresh(m3u8_url, resolvers.refresh_stream)
+                    if new_url:
+                        m3u8_url = new_url
                         continue
+                if attempt < self.retries:
+                    metrics.count_retry('download')
+                    time.sleep(RETRY_DELAY * attempt)
+        finally:
+            # Every submitted download is counted, whatever happened to it
+            if not success:
+                metrics.count_failure('download')
+            self._report(label, key, success)
+        return success
+
+    def submit(self, label, m3u8_url, output_path, manifest=None, key=None, on_success=None):
+        """Queue one download; returns a future resolving to True/False.
+
+        Finished files are recorded in manifest, then on_success(output_path, m3u8_url, duration) is called.
+        """
+        with self.lock:
+            self.total += 1
+        future = self.executor.submit(self._download, label, key or label, m3u8_url, output_path, manifest, on_success)
+        self.futures.append(future)
+        return future
+
+    def wait(self):
+        """Wait for every queued download and return (downloaded, failed)."""
+        self.executor.shutdown(wait=True)
+        return self.downloaded, self.failed
+
+def index_titles(anime_data):
+    """Map the content title of every movie and episode ('S0E1 - ...', 'S1E5 - ...') to (subfolder, title)."""
+    titles = {}
+    for movie in anime_data.get('movies', {}).get('movie_list', []):
+        titles[f"S0E{movie['movie_number']} - {movie['movie_name']}"] = ('movies', movie['movie_name'])
+    for season_name, season_data in anime_data.get('seasons', {}).items():
+        season_number = season_name.split(' ')[1]
+        for episode_id, episode_data in season_data.get('episodes', {}).items():
+            episode_title = episode_data['episode_title']
+            titles[f"S{season_number}E{episode_id[1:]} - {episode_title}"] = ('seasons', episode_title)
+    return titles
+
+def build_output_path(anime_dir, titles, episode_name, language):
+    """Return the target .mp4 path of an episode/movie in the given language folder (titles: see index_titles)."""
+    # Movies go into the movies folder, episodes into the seasons folder directly (no subfolder per episode)
+    default_subdir = 'movies' if episode_name.startswith('S0E') else 'seasons'
+    output_subdir, episode_title = titles.get(episode_name, (default_subdir, episode_name))
+
+    # Ensure the episode title is formatted correctly for filenames
+    episode_title = episode_title.replace(' ', '_') if episode_title.strip() else 'unknown_episode'
+
+    # Prevent double appending of episode titles
+    episode_filename = f"{episode_name}_{episode_title}.mp4" if episode_title != episode_name.split(' - ')[1].strip() else f"{episode_name}.mp4"
+
+    # Path to save the episode in the correct language folder (directly in seasons/movies, no additional episode subfolder)
+    return os.path.join(anime_dir, LANGUAGE_FOLDERS[language], output_subdir, episode_filename)
+
+def prepare_anime_dir(anime_data):
+    """Create the anime download folder with seasons/movies subfolders per language."""
+    anime_dir = os.path.join(DOWNLOADS_DIR, anime_data['anime_name'])
+    for lang in LANGUAGE_FOLDERS.values():
+        lang_dir = os.path.join(anime_dir, lang)
+        os.makedirs(os.path.join(lang_dir, 'seasons'), exist_ok=True)
+        os.makedirs(os.path.join(lang_dir, 'movies'), exist_ok=True)
+    return anime_dir
+
+def remove_empty_folders(anime_dir):
+    """Cleanup: remove empty language folders."""
+    for folder in LANGUAGE_FOLDERS.values():
+        lang_dir = os.path.join(anime_dir, folder)
+        for subfolder in ['movies', 'seasons']:
+            subfolder_path = os.path.join(lang_dir, subfolder)
+            if os.path.isdir(subfolder_path) and not any(os.scandir(subfolder_path)):  # Check if folder is empty
+                print(f"Removing empty folder: {subfolder_path}")
+                shutil.rmtree(subfolder_path)
+
+def queue_episode_downloads(scheduler, manifest, anime_dir, titles, episode_name, languages, debug=False, on_success=None):
+    """Queue the downloads of one episode's {language: m3u8_url}; returns (queued or present, already present).
+
+    on_success(language, output_path, m3u8_url, duration) is called for each finished download.
+    """
+    total_episodes = 0
+    skipped_episodes = 0
+
+    for language, m3u8_url in languages.items():
+        if language in LANGUAGE_FOLDERS:
+            total_episodes += 1
+
+            # Check if the m3u8 URL is valid
+            if not m3u8_url:
+                print(f"No m3u8 URL found for {episode_name} ({language})")
+                continue
+
+            output_path = build_output_path(anime_dir, titles, episode_name, language)
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)  # Ensure the subdirectory exists
+
+            # Skip files a previous run already finished
+            if manifest.is_complete(output_path):
+                if debug:
+                    print(f"Already downloaded: {episode_name} ({language})")
+                skipped_episodes += 1
+                continue
+
+            if debug:
+                print(f"Queueing {episode_name} ({language}) for {output_path}")
+                print(f"m3u8 URL: {m3u8_url}")
+
+            record = (lambda *done, language=language: on_success(language, *done)) if on_success else None
+            scheduler.submit(f"{episode_name} ({language})", m3u8_url, output_path, manifest, key=episode_name,
+                             on_success=record)
+
+    return total_episodes, skipped_episodes
+
+def download_anime_data(m3u8_data, anime_data, retries=3, debug=False, max_workers=MAX_WORKERS, max_per_host=MAX_PER_HOST):
+    """Download anime movies and episodes from m3u8 data and an already loaded anime data dict.
+
+    m3u8_data is a dict or any iterable of (episode_name, {language: m3u8_url});
+    downloads start while it is still being read. Returns the set of episode names with at least one failed download.
+    """
+    # Create main download folder for the anime
+    anime_dir = prepare_anime_dir(anime_data)
+    manifest = DownloadManifest(anime_dir)
+    titles = index_titles(anime_data)
+
+    scheduler = DownloadScheduler(max_workers=max_workers, max_per_host=max_per_host, retries=retries, debug=debug)
+    total_episodes = 0
+    skipped_episodes = 0
+
+    # Process m3u8 links and queue the downloads
+    episodes = m3u8_data.items() if isinstance(m3u8_data, dict) else m3u8_data
+    for episode_name, languages in episodes:
+        if debug:
+            print(f"Processing episode: {episode_name}")
+
+        queued, skipped = queue_episode_downloads(scheduler, manifest, anime_dir, titles, episode_name, languages, debug)
+        total_episodes += queued
+        skipped_episodes += skipped
+
+    downloaded_episodes, failed_episodes = scheduler.wait()
+    remove_empty_folders(anime_dir)
+
+    print(f"Download completed. Total episodes: {total_episodes}, Downloaded: {downloaded_episodes}, "
+          f"Already present: {skipped_episodes}, Failed: {failed_episodes}")
+    return scheduler.failed_keys
+
+def download_anime(anime_url, retries=3, debug=False, max_workers=MAX_WORKERS, max_per_host=MAX_PER_HOST,
+                   follow=False, poll_interval=2.0):
+    """Download every resolved stream of a series in the library that has no recorded download yet.
+
+    With follow=True streams are picked up as voe_extract resolves them, until it marks the
+    series as resolved.
+    """
+    store = library.Library()
+    anime = store.anime(anime_url)
+    if anime is None:
+        print(f"{anime_url} is not in the library, run info_getter.py first.")
+        return None
+
+    anime_data = store.anime_data(anime['id'])
+    anime_dir = prepare_anime_dir(anime_data)
+    manifest = DownloadManifest(anime_dir)
+    titles = index_titles(anime_data)
+    scheduler = DownloadScheduler(max_workers=max_workers, max_per_host=max_per_host, retries=retries, debug=debug)
+    total_episodes = 0
+    skipped_episodes = 0
+    queued = set()  # (episode id, language) handed to the scheduler
+
+    while True:
+        resolved = store.is_done(anime['id'], 'resolved')
+        pending = []
+        for episode, languages in store.undownloaded(anime['id']):
+            languages = {language: url for language, url in languages.items() if (episode['id'], language) not in queued}
+            if languages:
+                pending.append((episode, languages))
+        for episode, languages in pending:
+            queued.update((episode['id'], language) for language in languages)
+            episode_name = library.content_title(episode['season'], episode['number'], episode['title'])
+            record = (lambda language, path, url, duration, episode_id=episode['id']:
+                      store.record_download(episode_id, language, path, url, duration))
+            count, skipped = queue_episode_downloads(scheduler, manifest, anime_dir, titles, episode_name, languages,
+                                                     debug, on_success=record)
+            total_episodes += count
+            skipped_episodes += skipped
+        if not pending and (resolved or not follow):
+            break
+        if not pending:
+            time.sleep(poll_interval)
+
+    downloaded_episodes, failed_episodes = scheduler.wait()
+    remove_empty_folders(anime_dir)
+    store.close()
+    print(f"Download completed. Total episodes: {total_episodes}, Downloaded: {downloaded_episodes}, "
+          f"Already present: {skipped_episodes}, Failed: {failed_episodes}")
+    return scheduler.failed_keys
 
-                    # Download the episode
-                    convert_m3u8_to_mp4(m3u8_url, output_path)
-                    downloaded_episodes += 1
-
-        # Cleanup: remove empty language folders
-        for lang, folder in language_folders.items():
-            lang_dir = os.path.join(anime_dir, folder)
-            for subfolder in ['movies', 'seasons']:
-                subfolder_path = os.path.join(lang_dir, subfolder)
-                if not any(os.scandir(subfolder_path)):  # Check if folder is empty
-                    print(f"Removing empty folder: {subfolder_path}")
-                    shutil.rmtree(subfolder_path)
-
-        print(f"Download completed. Total episodes: {total_episodes}, Downloaded: {downloaded_episodes}")
-
-    except FileNotFoundError as e:
-        print(f"File not found: {e}")
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON: {e}")
-
-# Example usage
-m3u8_json_file = 'm3u8_data.json'
-anime_data_file = 'data.json'
-download_anime_content(m3u8_json_file, anime_data_file, retries=3, debug=True)
+if __name__ == "__main__":
+    # Example usage: python voe_download.py /anime/stream/death-note [--follow]
+    # --follow downloads while voe_extract.py is still resolving the series
+    args = [arg for arg in sys.argv[1:] if arg != '--follow']
+    download_anime(args[0] if args else '/anime/stream/death-note', retries=3, debug=True,
+                   follow='--follow' in sys.argv)
@@ -1,116 +1,184 @@
 import os
-import json
+import sys
+import time
 import httpx
 import re
-import time
-from bs4 import BeautifulSoup
-
-BASE_URL = 'https://aniworld.to'
 
 # Paths
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
-DATA_DIR = os.path.join(BASE_DIR, 'data')
-os.makedirs(DATA_DIR, exist_ok=True)
 
-def fetch_m3u8_url(redirect_url, retries=3, delay=3, debug=False):
-    """Fetches the m3u8 URL by following the redirect from the VOE link with retry logic."""
-    for attempt in range(retries):
-        try:
-            if debug:
-                print(f"Fetching VOE URL: {redirect_url} (Attempt {attempt + 1}/{retries})")
+# Share the HTTP transport with the scrapers in /scripts
+SCRIPTS_DIR = os.path.join(BASE_DIR, 'scripts')
+if SCRIPTS_DIR not in sys.path:
+    sys.path.append(SCRIPTS_DIR)
+
+import http_client
+import html_parser
+import library
+import metrics
+import redirects
+import resolvers
+import selection as content_selection
+import url_cache
+
+def fetch_m3u8_url(redirect_url, retries=3, debug=False):
+    """Fetches the m3u8 URL by following the redirect from the VOE link (retries up to `retries` attempts per request)."""
+    try:
+        if debug:
+            print(f"Fetching VOE URL: {redirect_url}")
+
+        # Skip the /redirect/ hops if this link was followed before
+        hoster_url = redirects.lookup(redirect_url)
+        response = None
+        if hoster_url:
+            # Network errors, 429 and 5xx are retried with backoff by the request policy
+            try:
+                response = http_client.get(hoster_url, attempts=retries)
+            except httpx.TransportError as e:
+                if debug:
+                    print(f"Known target {hoster_url} failed: {e}")
+            if response is None or response.is_error:
+                redirects.forget(redirect_url)  # The target moved or died, follow the redirect again
+                hoster_url = response = None
+        if response is None:
+            response = http_client.get(redirect_url, attempts=retries)
+        response.raise_for_status()
+        final_url = str(response.url)
+        if hoster_url is None:
+            redirects.record(redirect_url, final_url)
+
+        if debug:
+            print(f"Final redirected URL: {final_url}")
+
+        # Check for a JavaScript-based redirect within the page content
+        soup = html_parser.make_soup(response.text, html_parser.SCRIPT_TAGS)
+        script_tag = soup.find('script', string=re.compile(r'window\.location\.href'))
+        if script_tag:
+            match = re.search(r'window\.location\.href\s*=\s*[\'"]([^\'"]+)[\'"]', script_tag.string)
+            if match:
+                redirect_js_url = match.group(1)
+                if debug:
+                    print(f"Found JavaScript redirect URL: {redirect_js_url}")
 
-            with httpx.Client(follow_redirects=True, timeout=30) as client:
-                response = client.get(redirect_url)
+                # Follow the JS redirect manually
+                response = http_client.get(redirect_js_url, attempts=retries)
+                response.raise_for_status()
                 final_url = str(response.url)
-
                 if debug:
-                    print(f"Final redirected URL: {final_url}")
-
-                # Check for a JavaScript-based redirect within the page content
-                soup = BeautifulSoup(response.text, 'html.parser')
-                script_tag = soup.find('script', string=re.compile(r'window\.location\.href'))
-                if script_tag:
-                    match = re.search(r'window\.location\.href\s*=\s*[\'"]([^\'"]+)[\'"]', script_tag.string)
-                    if match:
-                        redirect_js_url = match.group(1)
-                        if debug:
-                            print(f"Found JavaScript redirect URL: {redirect_js_url}")
-                        
-                        # Follow the JS redirect manually
-                        response = client.get(redirect_js_url)
-                        final_url = str(response.url)
-                        if debug:
-                            print(f"Final redirected URL after JavaScript redirect: {final_url}")
-
-                # Extract the m3u8 URL from the final response content
-                m3u8_match = re.search(r'(https://[^"\']+\.m3u8[^\s"\']*)', response.text, re.IGNORECASE)
-                if m3u8_match:
-                    m3u8_url = m3u8_match.group(1)
+                    print(f"Final redirected URL after JavaScript redirect: {final_url}")
+
+        # Extract the m3u8 URL from the final response content
+        m3u8_match = re.search(r'(https?://[^"\']+\.m3u8[^\s"\']*)', response.text, re.IGNORECASE)
+        if m3u8_match:
+            m3u8_url = m3u8_match.group(1)
+            if debug:
+                print(f"Found m3u8 URL: {m3u8_url}")
+            url_cache.record(m3u8_url, redirect_url, 'VOE')  # Lets the downloader re-resolve it when it expires
+            return m3u8_url
+        else:
+            if debug:
+                print(f"Failed to find the m3u8 URL in {final_url}")
+            return None
+
+    except httpx.HTTPError as e:
+        print(f"Error fetching {redirect_url}: {e}")
+        return None
+
+resolvers.register('VOE', fetch_m3u8_url)
+
+def resolve_episode_links(episode_name, languages, retries=3, debug=False, selection=None):
+    """Resolve one stream per language of an episode, racing every hoster with a registered resolver.
+
+    Only languages the selection wants (by default: every language with a download folder)
+    are resolved. Returns ({language: m3u8_url}, attempted count).
+    """
+    selection = selection or content_selection.Selection()
+    m3u8_links = {}
+    attempted = 0
+    for language, services in languages.items():
+        if not selection.wants_language(language):
+            continue
+        if isinstance(services, list):
+            if resolvers.candidates(services):
+                attempted += 1
+                m3u8_url = resolvers.resolve_stream(services, retries=retries, debug=debug)
+                if m3u8_url:
                     if debug:
-                        print(f"Found m3u8 URL: {m3u8_url}")
-                    return m3u8_url
+                        print(f"m3u8 URL found for {episode_name} ({language}): {m3u8_url}")
+                    m3u8_links[language] = m3u8_url
                 else:
+                    metrics.count_failure('resolve')
                     if debug:
-                        print(f"Failed to find the m3u8 URL in {final_url}")
-                    return None
-
-        except httpx.RequestError as e:
-            print(f"Error fetching {redirect_url}, retrying ({attempt + 1}/{retries})...: {e}")
-            time.sleep(delay)
-    return None
-
-def process_voe_links_from_json(json_file, output_file="m3u8_data.json", retries=3, debug=False):
-    """Process VOE links from a JSON file and fetch m3u8 links with retry and delay logic."""
-    try:
-        json_path = os.path.join(DATA_DIR, json_file)
-        output_path = os.path.join(DATA_DIR, output_file)
-
-        with open(json_path, 'r', encoding='utf-8') as file:
-            data = json.load(file)
-        
-        m3u8_data = {}
-        success_count = 0
-        failed_count = 0
-        total_count = 0
-
-        for episode_name, languages in data.items():
-            if not isinstance(languages, dict):
-                print(f"Skipping invalid data in episode: {episode_name}")
-                continue
-
-            m3u8_data[episode_name] = {}
-            for language, services in languages.items():
-                if isinstance(services, list):
-                    voe_service = next((service for service in services if 'VOE' in service['service_name']), None)
-                    if voe_service:
-                        total_count += 1
-                        m3u8_url = fetch_m3u8_url(voe_service['stream_url'], retries=retries, debug=debug)
-                        if m3u8_url:
-                            if debug:
-                                print(f"m3u8 URL found for {episode_name} ({language}): {m3u8_url}")
-                            m3u8_data[episode_name][language] = m3u8_url
-                            success_count += 1
-                        else:
-                            if debug:
-                                print(f"Failed to fetch m3u8 URL for {episode_name} ({language})")
-                            failed_count += 1
-                else:
-                    print(f"Skipping non-list services in {episode_name} ({language})")
-
-        # Save m3u8 data to a new JSON file
-        with open(output_path, 'w', encoding='utf-8') as outfile:
-            json.dump(m3u8_data, outfile, ensure_ascii=False, indent=4)
-        print(f"m3u8 data saved to {output_path}")
-
-        # Display success and failure statistics
-        print(f"Success: {success_count}/{total_count}")
-        print(f"Failed: {failed_count}/{total_count}")
-
-    except FileNotFoundError:
-        print(f"File {json_file} not found in {DATA_DIR}.")
-    except json.JSONDecodeError as e:
-        print(f"Failed to decode JSON: {e}")
-
-# Example usage
-json_file = 'extracted_data.json'  # Replace with your JSON file
-process_voe_links_from_json(json_file, output_file="m3u8_data.json", retries=3, debug=True)
+                        print(f"Failed to fetch m3u8 URL for {episode_name} ({language})")
+        else:
+            print(f"Skipping non-list services in {episode_name} ({language})")
+    return m3u8_links, attempted
+
+def resolve_m3u8_links(data, retries=3, debug=False, selection=None):
+    """Resolve every episode/language in the extracted data dict to an m3u8 URL through the hoster resolvers."""
+    m3u8_data = {}
+    success_count = 0
+    total_count = 0
+
+    for episode_name, languages in data.items():
+        if not isinstance(languages, dict):
+            print(f"Skipping invalid data in episode: {episode_name}")
+            continue
+
+        m3u8_data[episode_name], attempted = resolve_episode_links(episode_name, languages, retries, debug, selection)
+        success_count += len(m3u8_data[episode_name])
+        total_count += attempted
+
+    # Display success and failure statistics
+    print(f"Success: {success_count}/{total_count}")
+    print(f"Failed: {total_count - success_count}/{total_count}")
+
+    return m3u8_data
+
+def resolve_anime(anime_url, retries=3, debug=False, follow=False, poll_interval=2.0):
+    """Resolve every extracted stream of a series in the library that has no m3u8 URL yet.
+
+    With follow=True streams are picked up as the extractor stores them, until it marks
+    the series as extracted. Streams that fail stay unresolved for the next run.
+    """
+    store = library.Library()
+    anime = store.anime(anime_url)
+    if anime is None:
+        print(f"{anime_url} is not in the library, run info_getter.py first.")
+        return
+
+    attempted_streams = set()  # (episode id, language) tried in this run
+    success_count = 0
+    total_count = 0
+    while True:
+        extracted = store.is_done(anime['id'], 'extracted')
+        pending = []
+        for episode, languages in store.unresolved(anime['id']):
+            languages = {language: services for language, services in languages.items()
+                         if (episode['id'], language) not in attempted_streams}
+            if languages:
+                pending.append((episode, languages))
+        for episode, languages in pending:
+            attempted_streams.update((episode['id'], language) for language in languages)
+            episode_name = library.content_title(episode['season'], episode['number'], episode['title'])
+            m3u8_links, attempted = resolve_episode_links(episode_name, languages, retries, debug)
+            store.save_m3u8(episode['id'], m3u8_links)
+            success_count += len(m3u8_links)
+            total_count += attempted
+        if not pending and (extracted or not follow):
+            break
+        if not pending:
+            time.sleep(poll_interval)
+
+    if extracted:
+        store.mark_done(anime['id'], 'resolved')
+    store.close()
+    print(f"Success: {success_count}/{total_count}")
+    print(f"Failed: {total_count - success_count}/{total_count}")
+
+if __name__ == "__main__":
+    # Example usage: python voe_extract.py /anime/stream/death-note [--follow]
+    # --follow resolves while extractor.py is still running
+    args = [arg for arg in sys.argv[1:] if arg != '--follow']
+    resolve_anime(args[0] if args else '/anime/stream/death-note', retries=3, debug=True,
+                  follow='--follow' in sys.argv)